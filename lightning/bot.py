@@ -34,6 +34,9 @@ from lightning import cache, config, errors
 from lightning.context import LightningContext
 from lightning.meta import __version__ as version
 from lightning.models import GuildBotConfig
+from lightning.utils.httpcache import HTTPCache
+from lightning.utils.httpclient import HTTPClient
+from lightning.utils.users import UserResolver
 
 log = logging.getLogger(__name__)
 
@@ -88,6 +91,10 @@ class LightningBot(commands.AutoShardedBot):
         headers = {"User-Agent": self.config['bot'].pop("user_agent", f"Lightning Bot {self.version}")}
         self.aiosession = aiohttp.ClientSession(headers=headers)
         self.redis_pool = cache.redis_pool
+        self.user_resolver = UserResolver(self)
+        # Third-party APIs get their own connection pool so they can't hold up webhooks
+        self.http_client = HTTPClient(headers=headers)
+        self.http_cache = HTTPCache(self.http_client)
 
         path = pathlib.Path("lightning/cogs/")
         files = path.glob("**/*.py")
@@ -322,6 +329,7 @@ class LightningBot(commands.AutoShardedBot):
         log.info("Closing database...")
         await self.pool.close()
         await self.aiosession.close()
+        await self.http_client.close()
         log.info("Closed aiohttp session and database successfully.")
         if self.redis_pool:
             self.redis_pool.connection_pool.disconnect()
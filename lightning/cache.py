@@ -19,6 +19,7 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 # Copyright ©︎ 2015 Rapptz
 # https://github.com/Rapptz/RoboDanny/blob/19e9dd927a18bdf021e4d1abb012ae2daf392bc2/cogs/utils/cache.py
 import asyncio
+import collections
 import enum
 import inspect
 import logging
@@ -69,6 +70,58 @@ class ExpiringCache(dict):
         super().__setitem__(key, (value, time.monotonic()))
 
 
+class ByteLRU:
+    """An LRU cache for bytes that is bounded by the total size of its values instead of the amount of keys"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = collections.OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def __setitem__(self, key, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            # It would just evict everything else
+            return
+
+        old = self._data.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+
+        self._data[key] = value
+        self.size += len(value)
+        while self.size > self.max_bytes:
+            _, evicted = self._data.popitem(last=False)
+            self.size -= len(evicted)
+
+    def __contains__(self, key) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.size = 0
+
+
 class BaseCache:
     """Base cache class"""
 
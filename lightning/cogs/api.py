@@ -20,7 +20,6 @@ import re
 import urllib.parse
 from datetime import datetime
 
-import aiohttp
 import discord
 from discord.ext import commands
 from discord.ext import menus as dmenus
@@ -28,6 +27,7 @@ from discord.ext import menus as dmenus
 from lightning import (LightningBot, LightningCog, LightningContext, command,
                        flags, group)
 from lightning.utils import helpers, paginator
+from lightning.utils.httpcache import HTTPCache
 
 
 class GelbooruPost:
@@ -107,17 +107,16 @@ class Crate:
 
 
 class CrateViewer(dmenus.KeysetPageSource):
-    def __init__(self, search_term: str, *, session: aiohttp.ClientSession):
-        self.session = session
+    def __init__(self, search_term: str, *, cache: HTTPCache):
+        self.cache = cache
         self.search_term = search_term
 
     def is_paginating(self) -> bool:
         return True
 
     async def request(self, query: str) -> dict:
-        async with self.session.get(f"https://crates.io/api/v1/crates{query}") as resp:
-            data = await resp.json()
-        return data
+        # Paging back and forth requests the same pages again
+        return await self.cache.request(f"https://crates.io/api/v1/crates{query}", ttl=300)
 
     async def get_page(self, specifier) -> CratesIOResponse:
         query = f"?q={urllib.parse.quote(self.search_term)}"
@@ -169,7 +168,7 @@ class API(LightningCog):
         if not resp:
             return
 
-        data = await ctx.request("http://api.tvmaze.com/shows/20683/episodes")
+        data = await ctx.request("http://api.tvmaze.com/shows/20683/episodes", cache=True, ttl=3600)
         episode_info = []
         for e in data:
             if e['season'] == season:
@@ -197,7 +196,7 @@ class API(LightningCog):
         if not resp:
             return
 
-        data = await ctx.request(url)
+        data = await ctx.request(url, cache=True, ttl=3600)
         em = discord.Embed(title=data['name'], url=data['url'])
         em.timestamp = datetime.fromisoformat(data['airstamp'])
         em.set_footer(text="Aired on")
@@ -275,13 +274,13 @@ class API(LightningCog):
     @crate.command(name='browse', aliases=['search'])
     async def browsecrates(self, ctx: LightningContext, *, crate: str) -> None:
         """Searches for a crate"""
-        menu = dmenus.MenuKeysetPages(CrateViewer(crate, session=self.bot.aiosession), clear_reactions_after=True,
-                                      check_embeds=True)
+        source = CrateViewer(crate, cache=self.bot.http_cache)
+        menu = dmenus.MenuKeysetPages(source, clear_reactions_after=True, check_embeds=True)
         await menu.start(ctx)
 
     @crate.command(name='get', enabled=False)
     async def showcrate(self, ctx: LightningContext, *, crate: str) -> None:
-        resp = await ctx.request(f"https://crates.io/api/v1/crates/{crate}")
+        resp = await ctx.request(f"https://crates.io/api/v1/crates/{crate}", cache=True, ttl=300)
         obj = Crate(resp)
         embed = discord.Embed(title=obj.name, description=obj.description)
         embed.set_footer(text="Exact match" if obj.exact_match else "Closest match")
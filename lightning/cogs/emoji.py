@@ -15,7 +15,6 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 import asyncio
-import io
 import logging
 import random
 import re
@@ -25,7 +24,9 @@ from discord.ext import commands
 
 from lightning import (CommandLevel, LightningBot, LightningCog,
                        LightningContext, command, converters, errors, group)
+from lightning.utils import helpers
 from lightning.utils.checks import has_guild_permissions, is_one_of_guilds
+from lightning.utils.emojis import EmojiIndex
 from lightning.utils.modlogformats import action_format
 from lightning.utils.paginator import BasicEmbedMenu, InfoMenuPages
 
@@ -36,11 +37,27 @@ log = logging.getLogger(__name__)
 class Emoji(LightningCog):
     def __init__(self, bot: LightningBot):
         self.bot = bot
+        self.emoji_index = EmojiIndex(self.apne)
+        if self.bot.is_ready():
+            self.emoji_index.rebuild(self.bot.guilds)
 
     @property
     def apne(self):
         return self.bot.config['bot']['nitro_emoji_guilds'] or []
 
+    @LightningCog.listener()
+    async def on_ready(self) -> None:
+        self.emoji_index.rebuild(self.bot.guilds)
+
+    @LightningCog.listener('on_guild_join')
+    @LightningCog.listener('on_guild_available')
+    async def index_guild_emojis(self, guild: discord.Guild) -> None:
+        self.emoji_index.add_guild(guild)
+
+    @LightningCog.listener()
+    async def on_guild_remove(self, guild: discord.Guild) -> None:
+        self.emoji_index.remove_guild(guild.id)
+
     @command(aliases=['nemoji', 'nitro'])
     @commands.cooldown(3, 15.0, commands.BucketType.channel)
     async def nitroemoji(self, ctx: LightningContext, emoji: str) -> None:
@@ -48,15 +65,13 @@ class Emoji(LightningCog):
 
         Note: The server which the emoji is from must be approved by the bot owner."""
         emojiname: str = emoji.strip(':;')
-        emoji: str = discord.utils.get(self.bot.emojis, name=emojiname)
+        emoji = self.emoji_index.get(emojiname)
 
-        if emoji and emoji.guild_id in self.apne:
+        if emoji:
             await ctx.send(str(emoji))
             return
 
-        emojiname = emojiname.lower()
-        rand = list(filter(lambda m: emojiname in m.name.lower() and m.is_usable() and m.guild_id in self.apne,
-                           self.bot.emojis))
+        rand = [emoji for emoji in self.emoji_index.search(emojiname) if emoji.is_usable()]
 
         if rand:
             em = random.choice(rand)
@@ -75,6 +90,7 @@ class Emoji(LightningCog):
         """Approves a guild for the nitro emoji command"""
         table = self.bot.config['bot']['nitro_emoji_guilds']
         await self.bot.config.append(table, guild.id)
+        self.emoji_index.approve(guild)
         await ctx.tick(True)
 
     @emoji.command(aliases=['copy'], level=CommandLevel.Admin)
@@ -106,13 +122,12 @@ class Emoji(LightningCog):
             await ctx.send("Emoji name cannot be longer than 32 characters!")
             return
 
-        emoji_link = await ctx.request(str(wurl))
-        _bytes = io.BytesIO()
-        _bytes.write(emoji_link)
-        _bytes.seek(0)
+        # Discord doesn't accept emojis larger than 256kb so there's no point in downloading more than that
+        image = await helpers.download_image(str(wurl), self.bot.aiosession, max_bytes=256 * 1024,
+                                             formats=("png", "jpeg", "gif"))
 
         try:
-            coro = ctx.guild.create_custom_emoji(name=emoji_name, image=_bytes.read(),
+            coro = ctx.guild.create_custom_emoji(name=emoji_name, image=image,
                                                  reason=action_format(ctx.author, "Emoji added by"))
             emoji = await asyncio.wait_for(coro, timeout=15.0)
         except asyncio.TimeoutError:
@@ -225,6 +240,8 @@ class Emoji(LightningCog):
 
     @LightningCog.listener()
     async def on_guild_emojis_update(self, guild, before, after) -> None:
+        self.emoji_index.add_guild(guild)
+
         if guild.id not in ROO_EMOTES:
             return
 
@@ -15,72 +15,80 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 import colorsys
+import hashlib
 import io
 import math
 import random
-import textwrap
 import typing
 from datetime import datetime
 
 import discord
 import uwuify
 from discord.ext import commands
-from jishaku.functools import executor_function
-from PIL import Image, ImageDraw, ImageFont
 
 from lightning import (LightningBot, LightningCog, LightningContext, command,
                        converters, flags)
+from lightning.cache import ByteLRU
 from lightning.errors import HTTPException, LightningError
-from lightning.utils import helpers
+from lightning.utils import helpers, imaging
+from lightning.utils.avatars import AvatarCache
+from lightning.utils.processpool import WorkerPool
 
 
 class Fun(LightningCog):
+    def __init__(self, bot: LightningBot):
+        super().__init__(bot)
+        # Image rendering gets its own processes so it doesn't fight the event loop over the GIL
+        self.image_pool = WorkerPool(workers=2, max_pending=8, timeout=20.0, initializer=imaging.preload_assets)
+        # Renders that only depend on their inputs are cached by a hash of them
+        self.render_cache = ByteLRU(16 * 1024 * 1024)
+        config = bot.config['bot']
+        self.avatar_cache = AvatarCache(bot.aiosession, directory=config.get("avatar_cache_directory"),
+                                        disk_max_bytes=config.get("avatar_cache_max_bytes", 256 * 1024 * 1024))
+
+    def cog_unload(self):
+        self.image_pool.shutdown()
+
+    async def render(self, func, *args) -> bytes:
+        """Renders an image in the worker pool, skipping the render if the same inputs were rendered before.
+
+        Only deterministic render functions should go through this."""
+        digest = hashlib.sha256(func.__name__.encode())
+        for arg in args:
+            digest.update(arg if isinstance(arg, bytes) else repr(arg).encode())
+            digest.update(b"\x00")
+        key = digest.hexdigest()
+
+        image = self.render_cache.get(key)
+        if image is None:
+            image = await self.image_pool.run(func, *args)
+            self.render_cache[key] = image
+        return image
+
+    @command(hidden=True)
+    @commands.is_owner()
+    async def imagestats(self, ctx: LightningContext) -> None:
+        """Shows how long image renders take on average and how often the render cache is hit"""
+        lines = [f"{name}: {count} renders, {(total / count) * 1000:.2f}ms average"
+                 for name, (count, total) in self.image_pool.stats.items()]
+        lines.append(f"{self.image_pool.timeouts} timed out, {self.image_pool.failures} failed")
+        cache = self.render_cache
+        lines.append(f"Render cache: {cache.hit_rate:.1%} hit rate ({cache.hits} hits, {cache.misses} misses), "
+                     f"{len(cache)} images using {cache.size} bytes")
+        await ctx.send("\n".join(lines))
 
     def c_to_f(self, c) -> int:
         """stolen from Robocop-ng. """
         return math.floor(9.0 / 5.0 * c + 32)
 
-    @executor_function
-    def make_kcdt(self, text: str) -> io.BytesIO:
-        img = Image.open("resources/templates/kurisudraw.png")
-        dafont = ImageFont.truetype(font="resources/fonts/Montserrat-Regular.ttf",
-                                    size=42, encoding="unic")
-        draw = ImageDraw.Draw(img)
-        # Shoutouts to that person on stackoverflow that I don't remember
-        y_text = 228
-        wdmax = 560
-        lines = textwrap.wrap(text, width=20)
-        for line in lines:
-            if y_text >= 390:
-                break
-            line_width, line_height = draw.textsize(line, font=dafont)
-            draw.multiline_text(((wdmax - line_width) / 2, y_text),
-                                line, font=dafont,
-                                fill="black")  # align="center")
-            y_text += line_height
-        finalbuffer = io.BytesIO()
-        img.save(finalbuffer, 'png')
-        finalbuffer.seek(0)
-        return finalbuffer
-
     @command(aliases=['kurisudraw'])
     @commands.cooldown(2, 60.0, commands.BucketType.guild)
     @commands.has_permissions(attach_files=True)
     async def kurisuwhiteboard(self, ctx: LightningContext, *, text: str) -> None:
         """Kurisu can solve this, can you?"""
         async with ctx.typing():
-            img_buff = await self.make_kcdt(text)
-            await ctx.send(file=discord.File(img_buff, filename="kurisudraw.png"))
-
-    @executor_function
-    def make_jpegify(self, _bytes: bytes) -> io.BytesIO:
-        img = Image.open(io.BytesIO(_bytes))
-
-        buff = io.BytesIO()
-        img.convert("RGB").save(buff, "jpeg", quality=random.randrange(1, 10))
-        buff.seek(0)
-
-        return buff
+            image = await self.render(imaging.render_kurisu_whiteboard, text)
+            await ctx.send(file=discord.File(io.BytesIO(image), filename="kurisudraw.png"))
 
     @command(aliases=['needsmorejpeg'])
     @commands.cooldown(3, 30.0, commands.BucketType.guild)
@@ -89,31 +97,9 @@ class Fun(LightningCog):
         """Jpegify an image"""
         async with ctx.typing():
             image = converters.Whitelisted_URL(image)
-            byte_data = await helpers.request(image.url, self.bot.aiosession)
-            image_buffer = await self.make_jpegify(byte_data)
-            await ctx.send(file=discord.File(image_buffer, filename="jpegify.jpeg"))
-
-    @executor_function
-    def make_lakitu(self, text: str) -> io.BytesIO:
-        img = Image.open("resources/templates/fyi.png")
-        font = ImageFont.truetype(font="resources/fonts/Heebo-Regular.ttf",
-                                  size=86, encoding="unic")
-        draw = ImageDraw.Draw(img)
-        text = textwrap.wrap(text, width=19)
-        y_text = 200
-        wdmax = 1150
-        for line in text:
-            if y_text >= 706:
-                break
-            line_width, line_height = draw.textsize(line, font=font)
-            draw.multiline_text(((wdmax - line_width) / 2, y_text),
-                                line, font=font,
-                                fill="black")  # align="center")
-            y_text += line_height
-        finalbuffer = io.BytesIO()
-        img.save(finalbuffer, 'png')
-        finalbuffer.seek(0)
-        return finalbuffer
+            byte_data = await helpers.download_image(image.url, self.bot.aiosession, max_bytes=8 * 1024 * 1024)
+            image = await self.image_pool.run(imaging.render_jpegify, byte_data, random.randrange(1, 10))
+            await ctx.send(file=discord.File(io.BytesIO(image), filename="jpegify.jpeg"))
 
     @command()
     @commands.cooldown(2, 60.0, commands.BucketType.guild)
@@ -121,52 +107,31 @@ class Fun(LightningCog):
     async def lakitufyi(self, ctx: LightningContext, *, text: str) -> None:
         """Makes a Lakitu FYI meme with your own text"""
         async with ctx.typing():
-            image_buffer = await self.make_lakitu(text)
-            await ctx.send(file=discord.File(image_buffer, filename="fyi.png"))
-
-    async def get_user_avatar(self, user: typing.Union[discord.User, discord.Member]) -> bytes:
-        async with self.bot.aiosession.get(str(user.avatar_url_as(format="png"))) as resp:
-            avy_bytes = await resp.read()
-        return avy_bytes
-
-    @executor_function
-    def make_circle_related_meme(self, avatar_bytes: bytes, path: str, resize_amount: tuple,
-                                 paste: tuple) -> io.BytesIO:
-        base_image = Image.open(path)
-        avatar = Image.open(io.BytesIO(avatar_bytes)).resize(resize_amount).convert("RGB")
-
-        mask = Image.new("L", avatar.size, 0)
-        mask_draw = ImageDraw.Draw(mask)
-        mask_draw.ellipse([(0, 0), avatar.size], fill=255)
-        mask = mask.resize(resize_amount, Image.ANTIALIAS)
-
-        base_image.paste(avatar, paste, mask=mask)
-
-        buffer = io.BytesIO()
-        base_image.save(buffer, "png")
-        buffer.seek(0)
+            image = await self.render(imaging.render_lakitu, text)
+            await ctx.send(file=discord.File(io.BytesIO(image), filename="fyi.png"))
 
-        return buffer
+    async def get_user_avatar(self, user: typing.Union[discord.User, discord.Member], size: int) -> bytes:
+        return await self.avatar_cache.get(user, size)
 
     @command()
     @commands.cooldown(2, 60.0, commands.BucketType.guild)
     async def screwedup(self, ctx: LightningContext, member: discord.Member = commands.default.Author) -> None:
         """Miko Iino tells you that you are screwed up in the head"""
         async with ctx.typing():
-            avy = await self.get_user_avatar(member)
-            image_buffer = await self.make_circle_related_meme(avy, "resources/templates/inthehead.png", (64, 64),
-                                                               (14, 43))
-            await ctx.send(file=discord.File(image_buffer, "screwedupinthehead.png"))
+            avy = await self.get_user_avatar(member, 64)
+            image = await self.render(imaging.render_circle_meme, avy, "resources/templates/inthehead.png",
+                                      (64, 64), (14, 43))
+            await ctx.send(file=discord.File(io.BytesIO(image), "screwedupinthehead.png"))
 
     @command()
     @commands.cooldown(2, 60.0, commands.BucketType.guild)
     async def iq(self, ctx: LightningContext, member: discord.Member = commands.default.Author) -> None:
         """Your iq is 3"""
         async with ctx.typing():
-            avy = await self.get_user_avatar(member)
-            image_buffer = await self.make_circle_related_meme(avy, "resources/templates/fujiwara-iq.png", (165, 165),
-                                                               (140, 26))
-            await ctx.send(file=discord.File(image_buffer, "huh_my_iq_is.png"))
+            avy = await self.get_user_avatar(member, 165)
+            image = await self.render(imaging.render_circle_meme, avy, "resources/templates/fujiwara-iq.png",
+                                      (165, 165), (140, 26))
+            await ctx.send(file=discord.File(io.BytesIO(image), "huh_my_iq_is.png"))
 
     @command()
     async def bam(self, ctx: LightningContext, target: discord.Member) -> None:
@@ -263,8 +228,8 @@ class Fun(LightningCog):
     async def cat(self, ctx: LightningContext) -> None:
         """Gives you a random cat picture"""
         try:
-            data = await helpers.request("https://api.thecatapi.com/v1/images/search", self.bot.aiosession,
-                                         headers={"x-api-key": self.bot.config['tokens']['catapi']})
+            data = await ctx.request("https://api.thecatapi.com/v1/images/search",
+                                     headers={"x-api-key": self.bot.config['tokens']['catapi']})
         except HTTPException as e:
             await ctx.send(f"https://http.cat/{e.status}")
             return
@@ -277,7 +242,7 @@ class Fun(LightningCog):
     @command()
     async def dog(self, ctx: LightningContext) -> None:
         """Gives you a random dog picture"""
-        data = await helpers.request("https://dog.ceo/api/breeds/image/random", self.bot.aiosession)
+        data = await ctx.request("https://dog.ceo/api/breeds/image/random")
         embed = discord.Embed(color=discord.Color.blurple())
         embed.set_image(url=data['message'])
         embed.set_footer(text="Powered by dog.ceo", icon_url="https://dog.ceo/img/favicon.png")
@@ -288,7 +253,8 @@ class Fun(LightningCog):
         """Shows an xkcd comic.
 
         If no value is supplied or the value isn't found, it gives the latest xkcd instead."""
-        xkcd_latest = await helpers.request("https://xkcd.com/info.0.json", self.bot.aiosession)
+        # A new comic comes out three times a week so the latest one only needs checking every so often
+        xkcd_latest = await ctx.request("https://xkcd.com/info.0.json", cache=True, ttl=600)
         xkcd_max = xkcd_latest.get("num")
 
         if value is not None and int(value) > 0 and int(value) < xkcd_max:
@@ -296,7 +262,7 @@ class Fun(LightningCog):
         else:
             entry = xkcd_max
 
-        xkcd = await helpers.request(f"https://xkcd.com/{entry}/info.0.json", self.bot.aiosession)
+        xkcd = await ctx.request(f"https://xkcd.com/{entry}/info.0.json", cache=True, ttl=86400)
         if xkcd is False:
             await ctx.send("Something went wrong grabbing that XKCD!")
             return
@@ -314,7 +280,7 @@ class Fun(LightningCog):
     @commands.bot_has_permissions(embed_links=True)
     async def headpat(self, ctx: LightningContext) -> None:
         """Pat someone"""
-        data = await helpers.request("https://nekos.life/api/pat", self.bot.aiosession)
+        data = await ctx.request("https://nekos.life/api/pat")
         color_random = [int(x * 255) for x in colorsys.hsv_to_rgb(random.random(), 1, 1)]
         embed = discord.Embed(colour=discord.Color.from_rgb(*color_random))
         embed.set_image(url=data['url'])
@@ -16,6 +16,7 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 import datetime
 import os
+import tempfile
 
 import dateutil.parser
 import discord
@@ -25,7 +26,8 @@ from lightning import (LightningBot, LightningCog, LightningContext, command,
                        group)
 from lightning.errors import LightningError
 from lightning.utils.checks import is_git_whitelisted
-from lightning.utils.helpers import run_in_shell
+from lightning.utils.helpers import (ARCHIVE_SPOOL_SIZE, run_in_shell,
+                                     write_archive)
 
 
 class GithubGist:
@@ -161,18 +163,14 @@ class Git(LightningCog):
     @commands.check(is_git_whitelisted)
     async def archivegist(self, ctx: LightningContext, limit: int) -> None:
         """Creates a gist with every message in channel"""
-        log_t = f"Archive of {ctx.channel} (ID: {ctx.channel.id}) "\
-                f"made on {datetime.datetime.utcnow()}\n\n"
         async with ctx.typing():
-            async for log in ctx.channel.history(limit=limit):
-                log_t += f"[{str(log.created_at)}]: {log.author} - {log.clean_content}"
-                if log.attachments:
-                    for attach in log.attachments:
-                        log_t += f"[{attach.filename}]({attach.url})\n\n"  # hackyish
-                else:
-                    log_t += "\n\n"
-
-        data = {"files": {f'{ctx.channel.name} | {datetime.datetime.utcnow()}.md': {'content': log_t}},
+            with tempfile.SpooledTemporaryFile(max_size=ARCHIVE_SPOOL_SIZE) as fp:
+                await write_archive(ctx.channel, fp, limit, fmt="md")
+                fp.seek(0)
+                # The gist API needs the whole file in the request body
+                content = fp.read().decode('utf-8')
+
+        data = {"files": {f'{ctx.channel.name} | {datetime.datetime.utcnow()}.md': {'content': content}},
                 "public": False,
                 "description": f"Archived Messages from #{ctx.channel.name}"}
 
@@ -16,6 +16,7 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
 import asyncio
+import hashlib
 import secrets
 import urllib.parse
 from io import BytesIO
@@ -24,16 +25,21 @@ from typing import Optional
 import asyncpg
 import discord
 from discord.ext import commands, menus
-from jishaku.functools import executor_function
-from PIL import Image
-from rapidfuzz import fuzz, process
+from lru import LRU
+from rapidfuzz import fuzz
 
 from lightning import (CommandLevel, LightningBot, LightningCog,
-                       LightningContext, command, group)
+                       LightningContext, command)
+from lightning import flags as dflags
+from lightning import group
+from lightning.cache import ByteLRU
 from lightning.converters import Whitelisted_URL
-from lightning.errors import LightningError
+from lightning.errors import HTTPException, LightningError
+from lightning.utils import helpers, imaging
 from lightning.utils.checks import has_channel_permissions
+from lightning.utils.fuzzy import FuzzyIndex
 from lightning.utils.paginator import InfoMenuPages
+from lightning.utils.processpool import WorkerPool
 
 
 class TinyDBPageSource(menus.ListPageSource):
@@ -65,9 +71,21 @@ class FindBMPAttachment(commands.CustomDefault):
         raise commands.BadArgument('Couldn\'t find an attachment that ends with ".bmp"')
 
 
+# 4096x4096, which is well past any 3DS or Switch screenshot
+BMP_MAX_PIXELS = 4096 * 4096
+
+
 class Homebrew(LightningCog):
     def __init__(self, bot: LightningBot):
         self.bot = bot
+        self.bmp_pool = WorkerPool(workers=1, max_pending=4, timeout=30.0)
+        # Attachment URLs don't change, so they map to the hash of what was downloaded from them
+        self.bmp_urls = LRU(256)
+        self.bmp_cache = ByteLRU(32 * 1024 * 1024)
+        self.command_indexes = {}
+
+    def cog_unload(self):
+        self.bmp_pool.shutdown()
 
     @group(aliases=['nuf', 'stability'], invoke_without_command=True, level=CommandLevel.Admin)
     @commands.bot_has_permissions(manage_webhooks=True)
@@ -142,21 +160,45 @@ class Homebrew(LightningCog):
         await self.bot.pool.execute(query, ctx.guild.id)
         await ctx.send("Successfully deleted webhook and configuration!")
 
-    @executor_function
-    def convert_to_png(self, _bytes) -> BytesIO:
-        image_b = Image.open(BytesIO(_bytes))
-        image_file = BytesIO()
-        image_b.save(image_file, format="png")
-        image_file.seek(0)
-        return image_file
+    async def convert_bmp(self, url: str, fmt: str, *, optimize: bool = False) -> bytes:
+        digest = self.bmp_urls.get(url)
+        image = self.bmp_cache.get((digest, fmt, optimize)) if digest else None
+        if image is not None:
+            return image
 
-    @command()
+        data = await helpers.download_image(url, self.bot.aiosession, max_bytes=16 * 1024 * 1024, formats=("bmp",))
+        digest = self.bmp_urls[url] = hashlib.sha256(data).hexdigest()
+        image = self.bmp_cache.get((digest, fmt, optimize))
+        if image is not None:
+            return image
+
+        try:
+            image = await self.bmp_pool.run(imaging.convert_image, data, fmt, max_pixels=BMP_MAX_PIXELS,
+                                            optimize=optimize)
+        except ValueError as e:
+            raise LightningError(str(e))
+        except OSError:
+            # PIL raises UnidentifiedImageError (an OSError) for files it can't read and OSError for truncated ones
+            raise LightningError("That image is corrupted or isn't a valid BMP file!")
+
+        self.bmp_cache[(digest, fmt, optimize)] = image
+        return image
+
+    @dflags.add_flag("--webp", is_bool_flag=True, help="Converts to a lossless WebP instead of a PNG")
+    @dflags.add_flag("--optimize", is_bool_flag=True, help="Spends more time compressing to make the file smaller")
+    @command(cls=dflags.FlagCommand)
     @commands.cooldown(30.0, 1, commands.BucketType.user)
-    async def bmp(self, ctx, link: Whitelisted_URL = FindBMPAttachment) -> None:
-        """Converts a .bmp image to .png"""
-        img_bytes = await ctx.request(link.url)
-        img_final = await self.convert_to_png(img_bytes)
-        await ctx.send(file=discord.File(img_final, filename=f"{secrets.token_urlsafe()}.png"))
+    async def bmp(self, ctx, **flags) -> None:
+        """Converts a .bmp image to .png (or .webp)"""
+        if flags['rest']:
+            link = Whitelisted_URL(flags['rest'].strip())
+        else:
+            link = await FindBMPAttachment().default(ctx, None)
+
+        fmt = "webp" if flags['webp'] else "png"
+        async with ctx.typing():
+            image = await self.convert_bmp(str(link.url), fmt, optimize=flags['optimize'])
+        await ctx.send(file=discord.File(BytesIO(image), filename=f"{secrets.token_urlsafe()}.{fmt}"))
 
     @command()
     @commands.cooldown(1, 5.0, commands.BucketType.member)
@@ -168,11 +210,10 @@ class Homebrew(LightningCog):
             raise LightningError("Search term cannot be 50 characters or more!")
 
         url = f"https://api.homebrew.space/search/{urllib.parse.quote(search)}"
-        async with self.bot.aiosession.get(url, timeout=30.0) as resp:
-            if resp.status == 200:
-                data = await resp.json()
-            else:
-                raise LightningError("Tinydb api not available. Try again later?")
+        try:
+            data = await ctx.request(url, cache=True, ttl=1800, timeout=30.0)
+        except HTTPException:
+            raise LightningError("Tinydb api not available. Try again later?")
 
         if not data:
             raise LightningError("Failed to find that search term!")
@@ -204,26 +245,24 @@ class Homebrew(LightningCog):
         (https://gitlab.com/lightning-bot/Lightning)"""
         await ctx.send_help('mod')
 
-    def get_match(self, word_list: list, word: str, score_cutoff: int = 60, partial=False) -> Optional[str]:
-        if partial:
-            result = process.extractOne(word, word_list, scorer=fuzz.partial_ratio,
-                                        score_cutoff=score_cutoff)
-        else:
-            result = process.extractOne(word, word_list, scorer=fuzz.ratio,
-                                        score_cutoff=score_cutoff)
-        if not result:
-            return None
-        return result
+    def get_match(self, group: commands.Group, word: str, score_cutoff: int = 60,
+                  partial=False) -> Optional[commands.Command]:
+        index = self.command_indexes.get(group.qualified_name)
+        if index is None:
+            # Subcommands don't change at runtime so the index only needs to be built once
+            index = self.command_indexes[group.qualified_name] = FuzzyIndex(group.all_commands.items())
+
+        result = index.search(word, scorer=fuzz.partial_ratio if partial else fuzz.ratio, score_cutoff=score_cutoff)
+        return result[1] if result else None
 
     @mod.group(name="3ds", aliases=['3d', '3DS', '2DS', '2ds'], invoke_without_command=True)
     async def mod_3ds(self, ctx: LightningContext, *, homebrew=None) -> None:
         """Gives information on 3DS modding."""
         if homebrew:
-            commands = list(self.mod_3ds.all_commands.keys())
-            match = self.get_match(commands, homebrew, 75)
+            match = self.get_match(self.mod_3ds, homebrew, 75)
             if match is not None:
                 # log.info(f"Command match found {match}")
-                await ctx.invoke(self.mod_3ds.get_command(match[0]))
+                await ctx.invoke(match)
                 return
 
         featurelist = ["Redirect your NAND to the SD card",
@@ -294,11 +333,10 @@ class Homebrew(LightningCog):
     async def mod_ds(self, ctx: LightningContext, *, homebrew=None) -> None:
         """Gives information on DS modding"""
         if homebrew:
-            commands = list(self.mod_ds.all_commands.keys())
-            match = self.get_match(commands, homebrew, 75)
+            match = self.get_match(self.mod_ds, homebrew, 75)
             if match is not None:
                 # self.bot.log.info(f"Command match found {match}")
-                await ctx.invoke(self.mod_ds.get_command(match[0]))
+                await ctx.invoke(match)
                 return
 
         if ctx.invoked_with in ("dsi", "DSi"):
@@ -14,7 +14,13 @@ GNU Affero General Public License for more details.
 You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
-import re
+import csv
+import gzip
+import io
+import json
+import tempfile
+from functools import partial
+from typing import List
 
 import discord
 from discord.ext import menus
@@ -22,6 +28,7 @@ from discord.ext.commands import default
 
 from lightning import (CommandLevel, LightningBot, LightningCog,
                        LightningContext, group)
+from lightning.errors import LightningError
 from lightning.formatters import truncate_text
 from lightning.utils.checks import has_guild_permissions
 from lightning.utils.helpers import Emoji
@@ -30,12 +37,14 @@ from lightning.utils.time import natural_timedelta
 
 
 class InfractionRecord:
-    def __init__(self, bot: LightningBot, record: dict):
+    def __init__(self, bot: LightningBot, record: dict, *, users: dict = None):
         self.id = record['id']
 
+        users = users or {}
         self.guild = bot.get_guild(record['guild_id']) or record['guild_id']
-        self.user = bot.get_user(record['user_id']) or record['user_id']
-        self.moderator = bot.get_user(record['moderator_id']) or record['user_id']
+        self.user = users.get(record['user_id']) or bot.get_user(record['user_id']) or record['user_id']
+        self.moderator = users.get(record['moderator_id']) or bot.get_user(record['moderator_id']) \
+            or record['moderator_id']
 
         self.action = ActionType(record['action'])
         self.reason = record['reason']
@@ -66,54 +75,57 @@ class InfractionSource(menus.KeysetPageSource):
         return True
 
     async def get_page(self, specifier):
+        # Ordering and seeking on id lets this use the (guild_id, ..., id) indexes no matter how deep the page is.
         query = """SELECT * FROM
-                       (SELECT * FROM infractions {where_clause} ORDER BY created_at {sort} LIMIT 5)
-                   subq ORDER BY created_at;"""
-
-        args = []
-        if specifier.reference is None:
-            where_clause = 'WHERE guild_id=$1'
-            args.append(self.guild.id)
-        elif specifier.direction is menus.PageDirection.after:
-            where_clause = 'WHERE id > $1 AND guild_id=$2'
-            args.append(specifier.reference[-1]['id'])
-            args.append(self.guild.id)
-        else:  # PageDirection.before
-            where_clause = 'WHERE id < $1 AND guild_id=$2'
-            args.append(specifier.reference[0]['id'])
-            args.append(self.guild.id)
+                       (SELECT * FROM infractions WHERE {where_clause} ORDER BY id {sort} LIMIT 5)
+                   subq ORDER BY id;"""
+
+        args = [self.guild.id]
+        conditions = ['guild_id=$1']
 
         if self.member:
-            last_arg = int(re.findall(r"\$\d+", where_clause)[-1].strip("$"))
-            where_clause += f' AND user_id=${last_arg + 1}'
             args.append(self.member.id)
+            conditions.append(f'user_id=${len(args)}')
+
+        if self.moderator:
+            args.append(self.moderator.id)
+            conditions.append(f'moderator_id=${len(args)}')
+
+        if specifier.reference is not None:
+            if specifier.direction is menus.PageDirection.after:
+                args.append(specifier.reference[-1]['id'])
+                conditions.append(f'id > ${len(args)}')
+            else:  # PageDirection.before
+                args.append(specifier.reference[0]['id'])
+                conditions.append(f'id < ${len(args)}')
 
         sort = 'ASC' if specifier.direction is menus.PageDirection.after else 'DESC'
+        query = query.format(where_clause=' AND '.join(conditions), sort=sort)
 
-        records = await self.connection.fetch(query.format(where_clause=where_clause, sort=sort), *args)
+        records = await self.connection.fetch(query, *args)
 
         if not records:
             raise ValueError
 
         return records
 
-    def format_embed_description(self, embed: discord.Embed, entries: list) -> discord.Embed:
+    def format_embed_description(self, embed: discord.Embed, entries: list, users: dict) -> discord.Embed:
         if self.member:
             for entry in entries:
-                moderator = self.bot.get_user(entry['moderator_id'])
+                moderator = users.get(entry['moderator_id']) or entry['moderator_id']
                 embed.add_field(name=f"{entry['id']}: {natural_timedelta(entry['created_at'])}",
                                 value=f"**Moderator**: {base_user_format(moderator)}\n"
                                       f"**Reason**: {truncate_text(entry['reason'], 45)}", inline=False)
         elif self.moderator:
             for entry in entries:
-                user = self.bot.get_user(entry['user_id'])
+                user = users.get(entry['user_id']) or entry['user_id']
                 embed.add_field(name=f"{entry['id']}: {natural_timedelta(entry['created_at'])}",
                                 value=f"**User**: {base_user_format(user)}\n"
                                       f"**Reason**: {truncate_text(entry['reason'], 45)}", inline=False)
         else:
             for entry in entries:
-                user = self.bot.get_user(entry['user_id'])
-                mod = self.bot.get_user(entry['moderator_id'])
+                user = users.get(entry['user_id']) or entry['user_id']
+                mod = users.get(entry['moderator_id']) or entry['moderator_id']
                 reason = entry['reason'] or 'No reason provided.'
                 embed.add_field(name=f"{entry['id']}: {natural_timedelta(entry['created_at'])}",
                                 value=f"**User**: {base_user_format(user)}\n**Moderator**: {base_user_format(mod)}"
@@ -122,7 +134,10 @@ class InfractionSource(menus.KeysetPageSource):
         return embed
 
     async def format_page(self, menu, entries):
-        embed = self.format_embed_description(discord.Embed(), entries)
+        # Resolve the whole page at once instead of one lookup per row
+        ids = [entry['user_id'] for entry in entries] + [entry['moderator_id'] for entry in entries]
+        users = await self.bot.user_resolver.resolve_many(ids)
+        embed = self.format_embed_description(discord.Embed(), entries, users)
 
         if self.member:
             embed.title = f"Infractions for {str(self.member)}"
@@ -136,6 +151,46 @@ class InfractionSource(menus.KeysetPageSource):
         return embed
 
 
+EXPORT_COLUMNS = ('id', 'user_id', 'moderator_id', 'action', 'reason', 'created_at', 'expiry', 'active', 'extra')
+# Anything bigger than this is written to disk instead of being kept in memory
+EXPORT_SPOOL_SIZE = 8 * 1024 * 1024
+# Rows are fetched, encoded and compressed in batches of this size
+EXPORT_BATCH_SIZE = 500
+
+
+def format_export_row(record) -> dict:
+    row = {}
+    for column in EXPORT_COLUMNS:
+        value = record[column]
+        if column == 'action':
+            value = ActionType(value).name
+        elif value is not None and column in ('created_at', 'expiry'):
+            value = value.isoformat()
+        row[column] = value
+    return row
+
+
+def write_export_batch(gz: gzip.GzipFile, rows: List[dict], fmt: str, *, header: bool = False) -> None:
+    """Encodes rows and writes them to the compressed export.
+
+    This is blocking and should be ran in an executor."""
+    buffer = io.StringIO(newline='')
+    if fmt == "csv":
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+        if header:
+            writer.writeheader()
+        for row in rows:
+            if row['extra'] is not None:
+                row['extra'] = json.dumps(row['extra'])
+            writer.writerow(row)
+    else:
+        for row in rows:
+            buffer.write(json.dumps(row))
+            buffer.write("\n")
+
+    gz.write(buffer.getvalue().encode('utf-8'))
+
+
 class Infractions(LightningCog, required=['Mod']):
     """Infraction related commands"""
 
@@ -154,7 +209,8 @@ class Infractions(LightningCog, required=['Mod']):
             await ctx.send(f"An infraction with ID {infraction_id} does not exist.")
             return
 
-        record = InfractionRecord(self.bot, record)
+        users = await self.bot.user_resolver.resolve_many([record['user_id'], record['moderator_id']])
+        record = InfractionRecord(self.bot, record, users=users)
         embed = discord.Embed(title=str(record.action).capitalize(), description=record.reason or "No reason provided",
                               timestamp=record.created_at)
         embed.add_field(name="User", value=base_user_format(record.user))
@@ -206,13 +262,76 @@ class Infractions(LightningCog, required=['Mod']):
         if not confirmation:
             return
 
-        query = """DELETE FROM infractions WHERE id=$1 AND guild_id=$2;"""
-        resp = await self.bot.pool.execute(query, infraction_id, ctx.guild.id)
-        if resp == "DELETE 0":
+        query = """WITH deleted AS (
+                       DELETE FROM infractions WHERE id=$1 AND guild_id=$2
+                       RETURNING guild_id, user_id, action
+                   ), decremented AS (
+                       UPDATE infraction_counts SET count = infraction_counts.count - 1
+                       FROM deleted
+                       WHERE infraction_counts.guild_id = deleted.guild_id
+                       AND infraction_counts.user_id = deleted.user_id
+                       AND infraction_counts.action = deleted.action
+                   )
+                   SELECT COUNT(*) FROM deleted;"""
+        deleted = await self.bot.pool.fetchval(query, infraction_id, ctx.guild.id)
+        if not deleted:
             await ctx.send(f"An infraction with ID {infraction_id} does not exist.")
         else:
             await ctx.send("Infraction deleted!")
 
+    async def write_export(self, guild_id: int, fp, fmt: str) -> int:
+        """Streams a guild's infractions into a gzip compressed file.
+
+        Encoding, compression and writing to the file happen in an executor, one batch at a time.
+
+        Returns the amount of rows that were written."""
+        query = f"SELECT {', '.join(EXPORT_COLUMNS)} FROM infractions WHERE guild_id=$1 ORDER BY id;"
+        loop = self.bot.loop
+        count = 0
+        gz = gzip.GzipFile(fileobj=fp, mode='wb')
+        try:
+            batch = []
+            async with self.bot.pool.acquire() as connection:
+                async with connection.transaction():
+                    async for record in connection.cursor(query, guild_id, prefetch=EXPORT_BATCH_SIZE):
+                        batch.append(format_export_row(record))
+                        if len(batch) == EXPORT_BATCH_SIZE:
+                            await loop.run_in_executor(None, partial(write_export_batch, gz, batch, fmt,
+                                                                     header=not count))
+                            count += len(batch)
+                            batch = []
+
+            if batch or not count:
+                await loop.run_in_executor(None, partial(write_export_batch, gz, batch, fmt, header=not count))
+                count += len(batch)
+        finally:
+            await loop.run_in_executor(None, gz.close)
+
+        return count
+
+    @infraction.command(name="export", level=CommandLevel.Admin)
+    @has_guild_permissions(manage_guild=True)
+    async def export_infractions(self, ctx: LightningContext, fmt: str.lower = "csv") -> None:
+        """Exports all of the server's infractions to a gzip compressed CSV or JSONL file"""
+        if fmt not in ("csv", "jsonl"):
+            raise LightningError("The export format must be either csv or jsonl!")
+
+        with tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE) as fp:
+            async with ctx.typing():
+                count = await self.write_export(ctx.guild.id, fp, fmt)
+
+            if not count:
+                await ctx.send("This server has no infractions to export.")
+                return
+
+            size = fp.tell()
+            if size > ctx.guild.filesize_limit:
+                raise LightningError(f"The export is too large to upload ({size} bytes).")
+
+            fp.seek(0)
+            await ctx.send(f"Exported {count} infractions.",
+                           file=discord.File(fp, filename=f"infractions_{ctx.guild.id}.{fmt}.gz"))
+
     async def start_keyset_pages(self, ctx: LightningContext, source: InfractionSource) -> None:
         menu = menus.MenuKeysetPages(source, timeout=60.0, clear_reactions_after=True,
                                      check_embeds=True)
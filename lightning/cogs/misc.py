@@ -103,14 +103,28 @@ class Misc(LightningCog):
     @command()
     @commands.bot_has_permissions(read_message_history=True)
     @commands.cooldown(rate=1, per=250.0, type=commands.BucketType.channel)
-    async def archive(self, ctx: LightningContext, limit: int) -> None:
-        """Archives the current channel's contents to a txt file."""
-        if limit > 250:
-            await ctx.send("You can only archive 250 messages.")
+    async def archive(self, ctx: LightningContext, limit: int, fmt: str.lower = "txt") -> None:
+        """Archives the current channel's contents to a file.
+
+        The archive can be a txt, md, jsonl, or html file. Archives of more than 1000 messages are gzip compressed."""
+        if limit > 10000:
+            await ctx.send("You can only archive 10000 messages.")
+            return
+
+        if fmt not in helpers.ARCHIVE_FORMATS:
+            await ctx.send(f"The format must be one of {', '.join(helpers.ARCHIVE_FORMATS)}.")
             return
 
         async with ctx.typing():
-            f = await helpers.archive_messages(ctx.channel, limit)
+            f = await helpers.archive_messages(ctx.channel, limit, fmt=fmt, compress=limit > 1000)
+
+        size = f.fp.seek(0, 2)
+        f.fp.seek(0)
+        max_size = ctx.guild.filesize_limit if ctx.guild else 8388608
+        if size > max_size:
+            f.close()
+            await ctx.send("The archive is too large to upload!")
+            return
 
         await ctx.send(file=f)
 
@@ -15,7 +15,7 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 import asyncio
-from collections import Counter
+import re
 from datetime import datetime, timedelta
 from typing import Union
 
@@ -30,15 +30,47 @@ from lightning.errors import LightningError, MuteRoleError, TimersUnavailable
 from lightning.formatters import truncate_text
 from lightning.models import Action, GuildModConfig, LoggingConfig
 from lightning.utils import helpers, modlogformats
+from lightning.utils.auditlog import AuditLogCache
 from lightning.utils.checks import (has_channel_permissions,
                                     has_guild_permissions)
+from lightning.utils.fanout import FanOut
+from lightning.utils.modlogqueue import ModLogQueue
+from lightning.utils.purge import PurgeJob
 from lightning.utils.time import (FutureTime, get_utc_timestamp,
                                   natural_timedelta, plural)
 
+SNOWFLAKE_REGEX = re.compile(r"\d{15,21}")
+MENTION_OR_ID_REGEX = re.compile(r"(?:<@!?)?(\d{15,21})>?")
+ID_RANGE_REGEX = re.compile(r"(\d{15,21})-(\d{15,21})")
+MASSBAN_FILE_SIZE_LIMIT = 1024 * 1024
+MASSBAN_CHUNK_SIZE = 25
+
 
 class Mod(LightningCog, required=["Configuration"]):
     """Moderation and server management commands."""
 
+    def __init__(self, bot):
+        super().__init__(bot)
+        self.log_queue = ModLogQueue(bot)
+        self.audit_log_cache = AuditLogCache()
+        # Discord ratelimits bans per guild so there's no reason to go wider than this.
+        self.ban_fanout = FanOut(workers=5)
+        self.massban_jobs = {}
+        self.purge_jobs = {}
+
+    def cog_unload(self):
+        # Slots that are waiting on a confirmation prompt are None
+        for task in self.massban_jobs.values():
+            if task is not None:
+                task.cancel()
+
+        for task in self.purge_jobs.values():
+            if task is not None:
+                task.cancel()
+
+        self.bot.loop.create_task(self.log_queue.close())
+        self.audit_log_cache.clear()
+
     @cache.cached('mod_config', cache.Strategy.lru)
     async def get_mod_config(self, guild_id):
         query = "SELECT * FROM guild_mod_config WHERE guild_id=$1;"
@@ -99,6 +131,49 @@ class Mod(LightningCog, required=["Configuration"]):
 
         await self.do_log_message(obj.guild_id, obj.event, obj, inf_id)
 
+    async def ban_members(self, guild: discord.Guild, targets: list, *, reason: str = None,
+                          delete_message_days: int = 0) -> tuple:
+        """Bans many users concurrently.
+
+        Returns a tuple of the targets that were banned and the targets that failed to be banned."""
+        async def ban(target):
+            await guild.ban(target, reason=reason, delete_message_days=delete_message_days)
+
+        result = await self.ban_fanout.run(targets, ban)
+        return result.sent, result.dead + result.failed
+
+    async def log_bulk_action(self, ctx: LightningContext, targets: list, action: str, *, reason: str = None,
+                              connection=None) -> None:
+        """Logs an action done to many targets at once.
+
+        Infractions are inserted in one query and one summarized message is sent to each log channel."""
+        connection = connection or self.bot.pool
+        actions = [Action(ctx.guild.id, action, target, ctx.author, reason) for target in targets]
+        infraction_ids = await Action.add_infractions(connection, actions)
+
+        record = await self.get_logging_record(ctx.guild.id)
+        if not record:
+            return
+
+        action = actions[0].action
+        records = record.get_channels_with_feature(str(action).upper())
+        for channel_id, record in records:
+            channel = ctx.guild.get_channel(channel_id)
+            if not channel:
+                continue
+
+            if record.format in ("minimal with timestamp", "minimal without timestamp"):
+                arg = False if record.format == "minimal without timestamp" else True
+                content = modlogformats.MinimalisticFormat.bulk_action(action, targets, ctx.author,
+                                                                       infraction_ids, reason, with_timestamp=arg)
+                self.log_queue.put(channel, content)
+            elif record.format == "emoji":
+                content = modlogformats.EmojiFormat.bulk_action(action, targets, ctx.author, infraction_ids, reason)
+                self.log_queue.put(channel, content, allowed_mentions=discord.AllowedMentions(users=[ctx.author]))
+            elif record.format == "embed":
+                embed = modlogformats.EmbedFormat.bulk_action(action, targets, ctx.author, infraction_ids, reason)
+                self.log_queue.put(channel, embed=embed)
+
     async def send_log_message(self, records, guild: discord.Guild, obj: Action, infraction_id: int) -> None:
         if not records:
             return
@@ -108,19 +183,17 @@ class Mod(LightningCog, required=["Configuration"]):
             if not channel:
                 continue
 
-            if record['format'] in ("minimal with timestamp", "minimal without timestamp"):
+            if record.format in ("minimal with timestamp", "minimal without timestamp"):
                 fmt = modlogformats.MinimalisticFormat.from_action(obj, infraction_id)
-                arg = False if record['format'] == "minimal without timestamp" else True
-                msg = fmt.format_message(with_timestamp=arg)
-                await channel.send(msg)
-            elif record['format'] == "emoji":
+                arg = False if record.format == "minimal without timestamp" else True
+                self.log_queue.put(channel, fmt.format_message(with_timestamp=arg))
+            elif record.format == "emoji":
                 fmt = modlogformats.EmojiFormat.from_action(obj, infraction_id)
-                msg = fmt.format_message()
-                await channel.send(msg, allowed_mentions=discord.AllowedMentions(users=[obj.target, obj.moderator]))
-            elif record['format'] == "embed":
+                self.log_queue.put(channel, fmt.format_message(),
+                                   allowed_mentions=discord.AllowedMentions(users=[obj.target, obj.moderator]))
+            elif record.format == "embed":
                 fmt = modlogformats.EmbedFormat.from_action(obj, infraction_id)
-                embed = fmt.format_message()
-                await channel.send(embed=embed)
+                self.log_queue.put(channel, embed=fmt.format_message())
 
     async def do_log_message(self, guild_id: int, action: Union[modlogformats.ActionType, str], obj: Action,
                              infraction_id: int) -> None:
@@ -271,8 +344,7 @@ class Mod(LightningCog, required=["Configuration"]):
     async def warn(self, ctx: LightningContext, target: converters.TargetMember(fetch_user=False), **flags) -> None:
         """Warns a user"""
         no_dm = not flags['nodm']
-        query = "SELECT COUNT(*) FROM infractions WHERE user_id=$1 AND guild_id=$2 AND action=$3;"
-        warns = await self.bot.pool.fetchval(query, target.id, ctx.guild.id, modlogformats.ActionType.WARN.value) or 0
+        warns = await Action.get_infraction_count(self.bot.pool, ctx.guild.id, target.id, modlogformats.ActionType.WARN)
         warn_count = await self.warn_count_check(ctx, warns + 1, target,
                                                  flags['rest'], no_dm)
         await ctx.send(f"{target} warned. User now has {plural(warn_count):warning}.")
@@ -370,7 +442,40 @@ class Mod(LightningCog, required=["Configuration"]):
 
         await ctx.send("Removed warn punishment configuration!")
 
+    async def run_purge_job(self, ctx: LightningContext, job: PurgeJob, message: discord.Message) -> None:
+        try:
+            await job.run()
+        except asyncio.CancelledError:
+            await ctx.send(f"Purge cancelled.\n{job.format_results()}", delete_after=40)
+            raise
+        except discord.Forbidden:
+            await ctx.send("I lost permissions to delete messages in this channel!")
+        except discord.HTTPException as e:
+            await ctx.send(f"Error: {e}\n{job.format_results()}", delete_after=40)
+        else:
+            await ctx.send(job.format_results(), delete_after=40)
+        finally:
+            if self.purge_jobs.get(ctx.channel.id) is asyncio.current_task():
+                del self.purge_jobs[ctx.channel.id]
+            try:
+                await message.delete()
+            except discord.HTTPException:
+                pass
+
     async def do_message_purge(self, ctx: LightningContext, limit: int, predicate, *, before=None, after=None) -> None:
+        if ctx.channel.id in self.purge_jobs:
+            raise LightningError("A purge is already running in this channel!")
+
+        # Reserve the channel so another purge can't start while this one is being confirmed
+        self.purge_jobs[ctx.channel.id] = None
+        try:
+            await self.start_message_purge(ctx, limit, predicate, before=before, after=after)
+        finally:
+            if self.purge_jobs.get(ctx.channel.id, False) is None:
+                del self.purge_jobs[ctx.channel.id]
+
+    async def start_message_purge(self, ctx: LightningContext, limit: int, predicate, *, before=None,
+                                  after=None) -> None:
         if limit >= 150:
             resp = await ctx.prompt(f"Are you sure you want to purge {limit} messages?", delete_after=True)
             if not resp:
@@ -384,22 +489,23 @@ class Mod(LightningCog, required=["Configuration"]):
         if after is not None:
             after = discord.Object(id=after)
 
-        try:
-            purged = await ctx.channel.purge(limit=limit, before=before, after=after, check=predicate)
-        except discord.Forbidden:
-            raise commands.MissingPermissions([])
-        except discord.HTTPException as e:
-            raise LightningError(f"Error: {e} (try a smaller message search?)")
-
-        spam = Counter(str(m.author) for m in purged)
-        dcount = len(purged)
-        messages = [f"**{plural(dcount):message} purged**"]
-        if dcount:
-            messages.append('')
-            spam = sorted(spam.items(), key=lambda m: m[1], reverse=True)
-            messages.extend(f'{name}: {count}' for name, count in spam)
-        msg = '\n'.join(messages)
-        await ctx.send(msg, delete_after=40)
+        message = await ctx.send(f"Purging... (searching {limit} messages)")
+        last_update = 0.0
+
+        async def progress(job):
+            nonlocal last_update
+            # Editing after every batch would just get us ratelimited
+            now = self.bot.loop.time()
+            if now - last_update < 5:
+                return
+            last_update = now
+            try:
+                await message.edit(content=f"Purging... {job.deleted} deleted out of {job.scanned} searched so far.")
+            except discord.HTTPException:
+                pass
+
+        job = PurgeJob(ctx.channel, predicate, limit=limit, before=before, after=after, progress=progress)
+        self.purge_jobs[ctx.channel.id] = self.bot.loop.create_task(self.run_purge_job(ctx, job, message))
 
     @commands.bot_has_permissions(manage_messages=True)
     @has_channel_permissions(manage_messages=True)
@@ -419,6 +525,21 @@ class Mod(LightningCog, required=["Configuration"]):
         elif isinstance(error, commands.BotMissingPermissions):
             await ctx.send("Bot is missing Manage Messages permission")
 
+    @has_channel_permissions(manage_messages=True)
+    @purge.command(name="cancel", level=CommandLevel.Mod)
+    async def purge_cancel(self, ctx: LightningContext) -> None:
+        """Cancels the running purge in this channel"""
+        if ctx.channel.id not in self.purge_jobs:
+            await ctx.send("There is no purge running in this channel.")
+            return
+
+        task = self.purge_jobs[ctx.channel.id]
+        if task is None:
+            await ctx.send("The purge in this channel is still waiting for confirmation.")
+            return
+
+        task.cancel()
+
     @commands.bot_has_permissions(manage_messages=True)
     @has_channel_permissions(manage_messages=True)
     @purge.command(name="user", level=CommandLevel.Mod)
@@ -443,6 +564,50 @@ class Mod(LightningCog, required=["Configuration"]):
         else:
             await self.do_message_purge(ctx, 100, lambda e: string in e.content)
 
+    @dflags.add_flag("--user", converter=discord.User, help="Only removes messages from this user")
+    @dflags.add_flag("--regex", converter=converters.Regex,
+                     help="Only removes messages with content matching this regex")
+    @dflags.add_flag("--has-attachment", is_bool_flag=True, help="Only removes messages with attachments")
+    @dflags.add_flag("--bot", is_bool_flag=True, help="Only removes messages from bots")
+    @dflags.add_flag("--before", converter=converters.SnowflakeOrPastTime,
+                     help="Only searches messages before this message ID or time ago (e.g. 1h)")
+    @dflags.add_flag("--after", converter=converters.SnowflakeOrPastTime,
+                     help="Only searches messages after this message ID or time ago (e.g. 1h)")
+    @commands.bot_has_permissions(manage_messages=True)
+    @has_channel_permissions(manage_messages=True)
+    @purge.command(cls=dflags.FlagCommand, name="filter", level=CommandLevel.Mod)
+    async def purge_filter(self, ctx: LightningContext, **flags) -> None:
+        """Removes messages that match all of the given filters in a single search.
+
+        The amount of messages to search can be given before the flags, by default 100."""
+        rest = flags['rest'].strip() if flags['rest'] else None
+        if rest and not rest.isdigit():
+            raise commands.BadArgument("The amount of messages to search must be a number!")
+        search = int(rest) if rest else 100
+
+        # Cheapest checks go first so the regex only runs on messages that passed everything else.
+        checks = []
+        if flags['user']:
+            user_id = flags['user'].id
+            checks.append(lambda m: m.author.id == user_id)
+        if flags['bot']:
+            checks.append(lambda m: m.author.bot)
+        if flags['has_attachment']:
+            checks.append(lambda m: len(m.attachments))
+        if flags['regex']:
+            search_regex = flags['regex'].search
+            checks.append(lambda m: m.content and search_regex(m.content) is not None)
+
+        if not checks and not flags['before'] and not flags['after']:
+            raise commands.BadArgument("You need to provide at least one filter!")
+
+        def predicate(message):
+            return all(check(message) for check in checks)
+
+        before = discord.utils.time_snowflake(flags['before']) if flags['before'] else None
+        after = discord.utils.time_snowflake(flags['after'], high=True) if flags['after'] else None
+        await self.do_message_purge(ctx, search, predicate, before=before, after=after)
+
     async def get_mute_role(self, ctx: LightningContext, *, temporary_role=False) -> discord.Role:
         """Gets the guild's mute role if it exists"""
         config = await self.get_mod_config(ctx.guild.id)
@@ -543,22 +708,191 @@ class Mod(LightningCog, required=["Configuration"]):
         await ctx.send(f"\N{OK HAND SIGN} {member.user} is now unbanned.")
         await self.log_action(ctx, member.user, "UNBAN")
 
-    @command(level=CommandLevel.Mod)
+    def can_bulk_ban(self, ctx: LightningContext, member: discord.Member) -> bool:
+        """A cheaper version of TargetMember's checks for bulk actions"""
+        if member.id in (ctx.me.id, ctx.author.id, ctx.guild.owner_id):
+            return False
+
+        if member.top_role >= ctx.me.top_role:
+            return False
+
+        if ctx.author.id != ctx.guild.owner_id and member.top_role >= ctx.author.top_role:
+            return False
+
+        return True
+
+    async def parse_massban_input(self, ctx: LightningContext, text: str) -> tuple:
+        """Parses leading IDs, mentions and ID ranges from the text and any attached text files.
+
+        Returns a tuple of the IDs, the ID ranges and the reason (the rest of the text)."""
+        ids = set()
+        ranges = []
+        words = text.split() if text else []
+        reason = None
+        for index, word in enumerate(words):
+            match = ID_RANGE_REGEX.fullmatch(word)
+            if match:
+                ranges.append((int(match.group(1)), int(match.group(2))))
+                continue
+
+            match = MENTION_OR_ID_REGEX.fullmatch(word)
+            if match:
+                ids.add(int(match.group(1)))
+                continue
+
+            reason = " ".join(words[index:])
+            break
+
+        for attachment in ctx.message.attachments:
+            if attachment.size > MASSBAN_FILE_SIZE_LIMIT:
+                raise commands.BadArgument(f"{attachment.filename} is too large to read IDs from.")
+
+            content = (await attachment.read()).decode("utf-8", "ignore")
+            ids.update(int(snowflake) for snowflake in SNOWFLAKE_REGEX.findall(content))
+
+        return ids, ranges, reason
+
+    def resolve_massban_targets(self, ctx: LightningContext, ids: set, ranges: list, flags) -> tuple:
+        """Resolves targets from the member cache without any API lookups.
+
+        Returns a tuple of the targets and how many members were skipped due to hierarchy."""
+        filters = []
+        if flags['joined_after']:
+            filters.append(lambda m: m.joined_at is not None and m.joined_at > flags['joined_after'])
+        if flags['created_after']:
+            filters.append(lambda m: m.created_at > flags['created_after'])
+        if flags['regex']:
+            filters.append(lambda m: flags['regex'].search(m.name) is not None)
+
+        def predicate(member):
+            return all(f(member) for f in filters)
+
+        targets = {}
+        skipped = 0
+
+        def add_member(member):
+            nonlocal skipped
+            if not predicate(member):
+                return
+
+            if not self.can_bulk_ban(ctx, member):
+                skipped += 1
+                return
+
+            targets[member.id] = member
+
+        for _id in ids:
+            member = ctx.guild.get_member(_id)
+            if member is not None:
+                add_member(member)
+            elif _id not in (ctx.me.id, ctx.author.id, ctx.guild.owner_id):
+                # Filters only apply to members, users not in the server are banned by ID.
+                targets[_id] = discord.Object(id=_id)
+
+        if ranges or (filters and not ids):
+            for member in ctx.guild.members:
+                if ranges and not any(start <= member.id <= end for start, end in ranges):
+                    continue
+                add_member(member)
+
+        return list(targets.values()), skipped
+
+    async def do_massban_job(self, ctx: LightningContext, targets: list, reason: str,
+                             message: discord.Message) -> None:
+        banned = []
+        failed = []
+        audit_reason = self.format_reason(ctx.author, reason)
+        try:
+            for index in range(0, len(targets), MASSBAN_CHUNK_SIZE):
+                chunk = targets[index:index + MASSBAN_CHUNK_SIZE]
+                chunk_banned, chunk_failed = await self.ban_members(ctx.guild, chunk, reason=audit_reason)
+                banned.extend(chunk_banned)
+                failed.extend(chunk_failed)
+                try:
+                    await message.edit(content=f"Banning... {len(banned) + len(failed)}/{len(targets)} "
+                                               f"({len(failed)} failed)")
+                except discord.HTTPException:
+                    pass
+        except asyncio.CancelledError:
+            await ctx.send(f"Massban cancelled after banning {plural(len(banned)):member}.")
+            raise
+        except Exception as e:
+            await self.bot.log_command_error(ctx, e)
+        else:
+            msg = f"Banned {plural(len(banned)):member}."
+            if failed:
+                msg += f" Failed to ban {plural(len(failed)):member}."
+            await ctx.send(msg)
+        finally:
+            if self.massban_jobs.get(ctx.guild.id) is asyncio.current_task():
+                del self.massban_jobs[ctx.guild.id]
+            if banned:
+                await self.log_bulk_action(ctx, banned, "BAN", reason=reason)
+
+    async def start_massban(self, ctx: LightningContext, flags: dict) -> None:
+        ids, ranges, reason = await self.parse_massban_input(ctx, flags['rest'])
+        has_filters = flags['joined_after'] or flags['created_after'] or flags['regex']
+        if not ids and not ranges and not has_filters:
+            raise commands.BadArgument("You need to provide users to ban or filters to find members with.")
+
+        targets, skipped = self.resolve_massban_targets(ctx, ids, ranges, flags)
+        if not targets:
+            raise LightningError("No users matched that criteria.")
+
+        text = f"Are you sure you want to ban {plural(len(targets)):user}?"
+        if skipped:
+            text += f" ({plural(skipped):member} will be skipped due to hierarchy)"
+        confirm = await ctx.prompt(text)
+        if not confirm:
+            return
+
+        message = await ctx.send(f"Banning... 0/{len(targets)}")
+        self.massban_jobs[ctx.guild.id] = self.bot.loop.create_task(self.do_massban_job(ctx, targets, reason,
+                                                                                        message))
+
+    @dflags.add_flag("--joined-after", converter=converters.SnowflakeOrPastTime,
+                     help="Only bans members that joined after this ID's creation or time ago (e.g. 30m)")
+    @dflags.add_flag("--created-after", converter=converters.SnowflakeOrPastTime,
+                     help="Only bans members whose accounts were created after this ID's creation or time ago")
+    @dflags.add_flag("--regex", converter=converters.Regex, help="Only bans members whose names match this regex")
     @commands.bot_has_guild_permissions(ban_members=True)
     @has_guild_permissions(ban_members=True)
-    async def massban(self, ctx: LightningContext, members: commands.Greedy[converters.TargetMember],
-                      *, reason: str) -> None:
+    @group(cls=dflags.FlagGroup, invoke_without_command=True, level=CommandLevel.Mod)
+    async def massban(self, ctx: LightningContext, **flags) -> None:
         """Mass bans users from the server.
 
+        Users can be given as IDs, mentions, ID ranges (e.g. 123-456), or an attached text file with IDs, \
+        followed by an optional reason. Members can also be filtered with the flags.
+
+        The ban runs in the background and can be cancelled with the cancel subcommand.
+
         Note: Users will not be notified about being banned from the server."""
-        confirm = await ctx.prompt(f"Are you sure you want to ban {plural(len(members)):member}?")
-        if not confirm:
+        if ctx.guild.id in self.massban_jobs:
+            raise LightningError("A massban is already running in this server!")
+
+        # Reserve the guild so another massban can't start while this one is being confirmed
+        self.massban_jobs[ctx.guild.id] = None
+        try:
+            await self.start_massban(ctx, flags)
+        finally:
+            if self.massban_jobs.get(ctx.guild.id, False) is None:
+                del self.massban_jobs[ctx.guild.id]
+
+    @commands.bot_has_guild_permissions(ban_members=True)
+    @has_guild_permissions(ban_members=True)
+    @massban.command(name="cancel", level=CommandLevel.Mod)
+    async def massban_cancel(self, ctx: LightningContext) -> None:
+        """Cancels the running massban in this server"""
+        if ctx.guild.id not in self.massban_jobs:
+            await ctx.send("There is no massban running in this server.")
+            return
+
+        task = self.massban_jobs[ctx.guild.id]
+        if task is None:
+            await ctx.send("The massban in this server is still waiting for confirmation.")
             return
 
-        async with self.bot.pool.acquire() as con:
-            for member in members:
-                await ctx.guild.ban(member, delete_message_days=0)
-                await self.log_action(ctx, member, "BAN", connection=con)
+        task.cancel()
 
     @dflags.add_flag("--nodm", "--no-dm", is_bool_flag=True,
                      help="Bot does not DM the user the reason for the action.")
@@ -745,20 +1079,20 @@ class Mod(LightningCog, required=["Configuration"]):
             if not channel:
                 continue
 
-            if record['format'] in ("minimal with timestamp", "minimal without timestamp"):
-                arg = False if record['format'] == "minimal without timestamp" else True
+            if record.format in ("minimal with timestamp", "minimal without timestamp"):
+                arg = False if record.format == "minimal without timestamp" else True
                 message = modlogformats.MinimalisticFormat.timed_action_expired(action.lower(), user, moderator,
                                                                                 timer.created_at, timer.expiry,
                                                                                 with_timestamp=arg)
-                await channel.send(message)
-            elif record['format'] == "emoji":
+                self.log_queue.put(channel, message)
+            elif record.format == "emoji":
                 message = modlogformats.EmojiFormat.timed_action_expired(action.lower(), user, moderator,
                                                                          timer.created_at)
-                await channel.send(message, allowed_mentions=discord.AllowedMentions(users=[user, moderator]))
-            elif record['format'] == "embed":
+                self.log_queue.put(channel, message, allowed_mentions=discord.AllowedMentions(users=[user, moderator]))
+            elif record.format == "embed":
                 embed = modlogformats.EmbedFormat.timed_action_expired(action.lower(), moderator, user,
                                                                        timer.created_at)
-                await channel.send(embed=embed)
+                self.log_queue.put(channel, embed=embed)
 
     @LightningCog.listener()
     async def on_timeban_job_complete(self, timer):
@@ -836,30 +1170,17 @@ class Mod(LightningCog, required=["Configuration"]):
 
     # Logging
     # -------
-    async def fetch_audit_log_entry(self, guild, action, *, target=None, limit: int = 50):
-        async for entry in guild.audit_logs(limit=limit, action=action):
-            td = datetime.utcnow() - entry.created_at
-            if td < timedelta(seconds=10):
-                if target is not None and entry.target == target:
-                    return entry
-                else:
-                    continue
-            else:
-                continue
-
-        return None
+    @LightningCog.listener()
+    async def on_guild_remove(self, guild):
+        self.audit_log_cache.remove(guild.id)
 
     @LightningCog.listener()
     async def on_member_ban(self, guild, user):
         await self.bot.wait_until_ready()
-        # Wait for Audit Log to update
-        await asyncio.sleep(0.5)
-
-        if not guild.me.guild_permissions.view_audit_log:
-            return
 
-        entry = await self.fetch_audit_log_entry(guild, discord.AuditLogAction.ban, target=user)
-        if entry.user == self.bot.user:
+        entry = await self.audit_log_cache.find(guild, discord.AuditLogAction.ban, user.id, max_age=10,
+                                                retry_after=0)
+        if entry is None or entry.user == self.bot.user:
             # Assuming it's already logged
             return
 
@@ -870,14 +1191,10 @@ class Mod(LightningCog, required=["Configuration"]):
     @LightningCog.listener()
     async def on_member_unban(self, guild, user):
         await self.bot.wait_until_ready()
-        # Wait for Audit Log to update
-        await asyncio.sleep(0.5)
 
-        if not guild.me.guild_permissions.view_audit_log:
-            return
-
-        entry = await self.fetch_audit_log_entry(guild, discord.AuditLogAction.unban, target=user)
-        if entry.user == self.bot.user:
+        entry = await self.audit_log_cache.find(guild, discord.AuditLogAction.unban, user.id, max_age=10,
+                                                retry_after=0)
+        if entry is None or entry.user == self.bot.user:
             # Assuming it's already logged
             return
 
@@ -907,15 +1224,15 @@ class Mod(LightningCog, required=["Configuration"]):
 
         guild = member.guild
         async for channel, record in self.get_records(guild, "MEMBER_JOIN"):
-            if record['format'] == "minimal with timestamp":
+            if record.format == "minimal with timestamp":
                 message = modlogformats.MinimalisticFormat.join_leave("MEMBER_JOIN", member)
-                await channel.send(message)
-            elif record['format'] == "emoji":
+                self.log_queue.put(channel, message)
+            elif record.format == "emoji":
                 message = modlogformats.EmojiFormat.join_leave("MEMBER_JOIN", member)
-                await channel.send(message, allowed_mentions=discord.AllowedMentions(users=[member]))
-            elif record['format'] == "embed":
+                self.log_queue.put(channel, message, allowed_mentions=discord.AllowedMentions(users=[member]))
+            elif record.format == "embed":
                 embed = modlogformats.EmbedFormat.join_leave("MEMBER_JOIN", member)
-                await channel.send(embed=embed)
+                self.log_queue.put(channel, embed=embed)
 
     @LightningCog.listener()
     async def on_member_remove(self, member):
@@ -923,21 +1240,19 @@ class Mod(LightningCog, required=["Configuration"]):
 
         guild = member.guild
         async for channel, record in self.get_records(guild, "MEMBER_LEAVE"):
-            if record['format'] == "minimal with timestamp":
+            if record.format == "minimal with timestamp":
                 message = modlogformats.MinimalisticFormat.join_leave("MEMBER_LEAVE", member)
-                await channel.send(message)
-            elif record['format'] == "emoji":
+                self.log_queue.put(channel, message)
+            elif record.format == "emoji":
                 message = modlogformats.EmojiFormat.join_leave("MEMBER_LEAVE", member)
-                await channel.send(message, allowed_mentions=discord.AllowedMentions(users=[member]))
-            elif record['format'] == "embed":
+                self.log_queue.put(channel, message, allowed_mentions=discord.AllowedMentions(users=[member]))
+            elif record.format == "embed":
                 embed = modlogformats.EmbedFormat.join_leave("MEMBER_LEAVE", member)
-                await channel.send(embed=embed)
+                self.log_queue.put(channel, embed=embed)
 
         # Kick stuff
-        if not guild.me.guild_permissions.view_audit_log:
-            return
-
-        entry = await self.fetch_audit_log_entry(guild, discord.AuditLogAction.kick, target=member)
+        entry = await self.audit_log_cache.find(guild, discord.AuditLogAction.kick, member.id, max_age=10,
+                                                retry_after=0)
 
         if not entry:
             return
@@ -953,24 +1268,6 @@ class Mod(LightningCog, required=["Configuration"]):
         inf_id = await obj.add_infraction(self.bot.pool)
         await self.do_log_message(obj.guild_id, obj.event, obj, inf_id)
 
-    async def find_occurance(self, guild, action, match, limit=50, retry=True):
-        if not guild.me.guild_permissions.view_audit_log:
-            return
-
-        entry = None
-        async for e in guild.audit_logs(action=action, limit=limit):
-            if match(e):
-                if entry is None or e.id > entry.id:
-                    entry = e
-                    break
-
-        if entry is None and retry:
-            await asyncio.sleep(2)
-            return await self.find_occurance(guild, action, match, limit, False)
-        # if entry is not None and isinstance(entry.target, discord.Object):
-        #    entry.target = await self.bot.get_user(entry.target.id)
-        return entry
-
     @LightningCog.listener()
     async def on_member_update(self, before, after):
         await self.bot.wait_until_ready()
@@ -983,26 +1280,26 @@ class Mod(LightningCog, required=["Configuration"]):
                 return
 
             def check(e):
-                return e.target.id == before.id and hasattr(e.changes.before, "roles") \
-                    and hasattr(e.changes.after, "roles") and \
+                return hasattr(e.changes.before, "roles") and hasattr(e.changes.after, "roles") and \
                     all(r in e.changes.before.roles for r in removed) and \
                     all(r in e.changes.after.roles for r in added)
 
-            entry = await self.find_occurance(guild, discord.AuditLogAction.member_role_update,
-                                              check)
+            # Without a max age an older change with the same roles could be credited to the wrong moderator
+            entry = await self.audit_log_cache.find(guild, discord.AuditLogAction.member_role_update, before.id,
+                                                    check=check, max_age=10)
 
             async for channel, record in self.get_records(guild, "MEMBER_ROLE_CHANGE"):
-                if record['format'] in ("minimal with timestamp", "minimal without timestamp"):
-                    arg = False if record['format'] == "minimal without timestamp" else True
+                if record.format in ("minimal with timestamp", "minimal without timestamp"):
+                    arg = False if record.format == "minimal without timestamp" else True
                     message = modlogformats.MinimalisticFormat.role_change(after, added, removed, entry=entry,
                                                                            with_timestamp=arg)
-                    await channel.send(message)
-                elif record['format'] == "emoji":
+                    self.log_queue.put(channel, message)
+                elif record.format == "emoji":
                     message = modlogformats.EmojiFormat.role_change(added, removed, after, entry=entry)
-                    await channel.send(message)
-                elif record['format'] == "embed":
+                    self.log_queue.put(channel, message)
+                elif record.format == "embed":
                     embed = modlogformats.EmbedFormat.role_change(after, added, removed, entry=entry)
-                    await channel.send(embed=embed)
+                    self.log_queue.put(channel, embed=embed)
 
 
 def setup(bot) -> None:
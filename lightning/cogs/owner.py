@@ -226,6 +226,17 @@ class Owner(*OPTIONAL_FEATURES, *STANDARD_FEATURES):
         embed.set_footer(text=f"{total} bugs")
         await ctx.send(embed=embed)
 
+    @Feature.Command()
+    async def httpstats(self, ctx: LightningContext) -> None:
+        """Shows request timings and circuit breakers for third-party APIs"""
+        client = self.bot.http_client
+        rows = [(host, stats.requests, stats.retries, stats.failures, f"{stats.average_time * 1000:.0f}ms",
+                 f"{stats.max_time * 1000:.0f}ms", "open" if client.breakers[host].open else "closed")
+                for host, stats in client.stats.items()]
+        table = tabulate.tabulate(rows, ("Host", "Requests", "Retries", "Failures", "Average", "Max", "Breaker"))
+        count, size, revalidated = self.bot.http_cache.stats
+        await ctx.send(f"```\n{table}\n```\nCache: {count} responses using {size} bytes, {revalidated} revalidated")
+
     @Feature.Command()
     async def prettycommandlist(self, ctx: LightningContext) -> None:
         commands = []
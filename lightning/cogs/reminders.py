@@ -21,7 +21,7 @@ import logging
 import textwrap
 import traceback
 from datetime import datetime, timedelta
-from typing import Optional, Union
+from typing import List, Optional, Union
 
 import asyncpg
 import dateutil.parser
@@ -35,10 +35,72 @@ from lightning import LightningBot, LightningCog, LightningContext, group
 from lightning.config import Storage
 from lightning.formatters import plural
 from lightning.models import Timer
+from lightning.utils.fanout import FanOut
 from lightning.utils.helpers import BetterUserObject, dm_user
 
 log = logging.getLogger(__name__)
 
+NINUPDATES_FEED_URL = "https://yls8.mtheall.com/ninupdates/feed.php"
+# Bounds (in seconds) for how often the feed is polled.
+NINUPDATES_MIN_INTERVAL = 45.0
+NINUPDATES_MAX_INTERVAL = 300.0
+
+
+def get_last_updated_times(data: Storage) -> dict:
+    """Gets when each console was last updated from the stored ninupdates data.
+
+    Consoles without a timestamp are left out so they're treated as never updated."""
+    return {console: data[console]["last_updated"] for console in data
+            if data[console].get("last_updated") is not None}
+
+
+def parse_ninupdates_feed(raw_bytes: bytes, feedurl: str, last_updated: dict) -> List[tuple]:
+    """Parses the ninupdates feed and returns the entries that are newer than the last seen updates.
+
+    This is blocking and should be ran in an executor.
+
+    Parameters
+    ----------
+    raw_bytes : bytes
+        The body of the feed
+    feedurl : str
+        The URL of the feed
+    last_updated : dict
+        A mapping of console names to when they were last updated
+
+    Returns
+    -------
+    List[tuple]
+        A list of (console, version, link, timestamp) for each new entry
+    """
+    feed = feedparser.parse(raw_bytes, response_headers={"Content-Location": feedurl})
+    entries = []
+    for entry in feed["entries"]:
+        version = entry["title"].split(" ")[-1]
+        console = entry["title"].replace(version, " ").strip()
+        link = entry["link"]
+
+        if "published" in entry and entry.published:
+            timestamp = dateutil.parser.parse(entry.published)
+        elif "updated" in entry:
+            timestamp = dateutil.parser.parse(entry.updated)
+        else:
+            continue
+
+        try:
+            # Migration things:tm:
+            if timestamp <= datetime.fromtimestamp(last_updated[console], tz=timestamp.tzinfo):
+                continue
+        except TypeError:
+            if timestamp <= datetime.fromisoformat(last_updated[console]):
+                continue
+        except KeyError:
+            pass
+
+        last_updated[console] = timestamp.isoformat()
+        entries.append((console, version, link, timestamp))
+    return entries
+
 
 class Reminders(LightningCog):
     """Commands to remind you something"""
@@ -49,6 +111,11 @@ class Reminders(LightningCog):
         self._current_task = None
         self.dispatch_jobs = self.bot.loop.create_task(self.do_jobs())
         self.feed_digest = None
+        self.webhook_fanout = FanOut(workers=15)
+        # Conditional request validators and the current polling interval for the feed
+        self.feed_state = Storage("resources/nindy_feed_state.json")
+        interval = (self.feed_state.get("feed") or {}).get("interval", NINUPDATES_MIN_INTERVAL)
+        self.stability.change_interval(seconds=interval)
         self.stability.start()
 
     def cog_unload(self) -> None:
@@ -299,72 +366,104 @@ class Reminders(LightningCog):
                 kwargs.pop("reference")
                 await try_to_send(channel, f"{user.mention}: {message}")
 
+    def get_feed_headers(self) -> dict:
+        """Builds the conditional request headers for the feed from the stored validators"""
+        state = self.feed_state.get("feed") or {}
+        headers = {}
+        if state.get("etag"):
+            headers["If-None-Match"] = state["etag"]
+        if state.get("last_modified"):
+            headers["If-Modified-Since"] = state["last_modified"]
+        return headers
+
+    async def update_feed_state(self, *, changed: bool, etag: str = None, last_modified: str = None,
+                                keep_validators: bool = False) -> None:
+        """Updates the feed's validators and adjusts the polling interval.
+
+        The interval is reset whenever the feed changes and backs off while the feed is idle.
+        The validators are replaced with what the latest 200 response sent, even if that's nothing.
+        keep_validators should only be used for 304 responses."""
+        state = self.feed_state.get("feed") or {}
+        interval = state.get("interval", NINUPDATES_MIN_INTERVAL)
+        if changed:
+            new_interval = NINUPDATES_MIN_INTERVAL
+        else:
+            new_interval = min(interval * 1.5, NINUPDATES_MAX_INTERVAL)
+
+        if keep_validators:
+            etag, last_modified = state.get("etag"), state.get("last_modified")
+
+        new_state = {"etag": etag, "last_modified": last_modified, "interval": new_interval}
+        if new_interval != interval:
+            log.debug(f"Changing ninupdates polling interval from {interval}s to {new_interval}s")
+            self.stability.change_interval(seconds=new_interval)
+        elif new_state == state:
+            return
+
+        await self.feed_state.add("feed", new_state)
+
     async def check_ninupdate_feed(self):
         if not hasattr(self.bot, 'nintendo_updates'):
             self.bot.nintendo_updates = Storage("resources/nindy_data.json")
 
         data = self.bot.nintendo_updates
-        feedurl = 'https://yls8.mtheall.com/ninupdates/feed.php'
+        feedurl = NINUPDATES_FEED_URL
         # Letting feedparser do the request for us can block the entire bot
         # https://github.com/kurtmckee/feedparser/issues/111
-        async with self.bot.aiosession.get(feedurl, expect100=True) as resp:
+        async with self.bot.aiosession.get(feedurl, headers=self.get_feed_headers(), expect100=True) as resp:
+            if resp.status == 304:
+                # Nothing changed since our last poll
+                await self.update_feed_state(changed=False, keep_validators=True)
+                return
+
+            if resp.status != 200:
+                log.info(f"Got status {resp.status} while requesting the ninupdates feed")
+                return
+
             raw_bytes = await resp.read()
+            etag = resp.headers.get("ETag")
+            last_modified = resp.headers.get("Last-Modified")
 
         # Running feedparser is expensive.
+        # The digest is still checked as the server may not always send validators.
         digest = hashlib.sha256(raw_bytes).digest()
         if self.feed_digest == digest:
+            await self.update_feed_state(changed=False, etag=etag, last_modified=last_modified)
             return
 
         log.debug("Cached digest does not equal the current digest...")
-        feed = feedparser.parse(raw_bytes, response_headers={"Content-Location": feedurl})
+        last_updated = get_last_updated_times(data)
+        # Parsing is done in an executor so large feeds don't block the event loop.
+        entries = await self.bot.loop.run_in_executor(None, parse_ninupdates_feed, raw_bytes, feedurl,
+                                                      last_updated)
         self.feed_digest = digest
-        for entry in feed["entries"]:
-            version = entry["title"].split(" ")[-1]
-            console = entry["title"].replace(version, " ").strip()
-            link = entry["link"]
-
-            if "published" in entry and entry.published:
-                timestamp = dateutil.parser.parse(entry.published)
-            elif "updated" in entry:
-                timestamp = dateutil.parser.parse(entry.updated)
-            else:
-                continue
-
-            try:
-                # Migration things:tm:
-                if timestamp <= datetime.fromtimestamp(data[console]["last_updated"],
-                                                       tz=timestamp.tzinfo):
-                    continue
-            except TypeError:
-                if timestamp <= datetime.fromisoformat(data[console]['last_updated']):
-                    continue
-            except KeyError:
-                pass
-
+        for console, version, link, timestamp in entries:
             hook_text = f"`[{timestamp.strftime('%H:%M:%S')}]` 🚨 **System update detected for {console}: {version}**\n"\
                         f"More information at <{link}>"
             await data.add(console, {"version": version,
                                      "last_updated": timestamp.isoformat()})
             await self.dispatch_message(console, hook_text)
 
+        # Only store the validators after the entries were handled so a failure doesn't skip entries
+        await self.update_feed_state(changed=True, etag=etag, last_modified=last_modified)
+
     async def dispatch_message(self, console: str, text: str):
-        records = await self.bot.pool.fetch("SELECT * FROM nin_updates;")
+        records = await self.bot.pool.fetch("SELECT id, webhook_token FROM nin_updates;")
         log.info(f"Dispatching new update for {console} to {len(records)} servers.")
-        bad_webhooks = []
-        for record in records:
-            try:
-                webhook = discord.Webhook.partial(record['id'], record['webhook_token'],
-                                                  adapter=discord.AsyncWebhookAdapter(self.bot.aiosession))
-                await webhook.send(text)
-            except (discord.NotFound, discord.Forbidden):
-                bad_webhooks.append(record['id'])
-            except discord.HTTPException:
-                # discord heckin died
-                continue
+
+        async def send(record):
+            # Adapters are bound to a single webhook so each send needs its own.
+            webhook = discord.Webhook.partial(record['id'], record['webhook_token'],
+                                              adapter=discord.AsyncWebhookAdapter(self.bot.aiosession))
+            await webhook.send(text)
+
+        result = await self.webhook_fanout.run(records, send)
+        log.info(f"Dispatched update for {console}: {len(result.sent)} sent, {len(result.dead)} dead, "
+                 f"{len(result.failed)} failed.")
         # Remove deleted webhooks
-        if bad_webhooks:
-            query = "DELETE FROM nin_updates WHERE id=$1;"
-            await self.bot.pool.executemany(query, bad_webhooks)
+        if result.dead:
+            query = "DELETE FROM nin_updates WHERE id = ANY($1::bigint[]);"
+            await self.bot.pool.execute(query, [record['id'] for record in result.dead])
 
     @tasks.loop(seconds=45)
     async def stability(self) -> None:
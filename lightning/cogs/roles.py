@@ -20,18 +20,23 @@ from io import StringIO
 import discord
 import tabulate
 from discord.ext import commands
-from rapidfuzz import process
 
 from lightning import (CommandLevel, LightningBot, LightningCog,
                        LightningContext, command, group)
 from lightning.converters import Role
 from lightning.utils import paginator
 from lightning.utils.checks import has_guild_permissions
+from lightning.utils.fuzzy import FuzzyIndex
 
 
 class Roles(LightningCog):
     """Role based commands"""
 
+    def __init__(self, bot: LightningBot):
+        super().__init__(bot)
+        # guild_id: (toggleable role IDs, FuzzyIndex)
+        self.role_indexes = {}
+
     @command()
     @commands.guild_only()
     async def rolemembers(self, ctx: LightningContext, *, role: discord.Role) -> None:
@@ -43,14 +48,34 @@ class Roles(LightningCog):
         fp = StringIO(tabulate.tabulate([(str(r), r.id) for r in role.members], ("Name", "ID")))
         await ctx.send(file=discord.File(fp, "members.txt"))
 
+    @LightningCog.listener('on_guild_role_create')
+    @LightningCog.listener('on_guild_role_delete')
+    async def invalidate_role_index(self, role: discord.Role) -> None:
+        self.role_indexes.pop(role.guild.id, None)
+
+    @LightningCog.listener()
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role) -> None:
+        if before.name != after.name:
+            self.role_indexes.pop(after.guild.id, None)
+
+    @LightningCog.listener()
+    async def on_guild_remove(self, guild: discord.Guild) -> None:
+        self.role_indexes.pop(guild.id, None)
+
+    def get_role_index(self, guild: discord.Guild, role_ids: list) -> FuzzyIndex:
+        role_ids = tuple(role_ids)
+        cached = self.role_indexes.get(guild.id)
+        # The toggleable roles can change without a role event, so compare them as well.
+        if cached is not None and cached[0] == role_ids:
+            return cached[1]
+
+        roles = filter(None, (guild.get_role(role_id) for role_id in role_ids))
+        index = FuzzyIndex((role.name, role) for role in roles)
+        self.role_indexes[guild.id] = (role_ids, index)
+        return index
+
     async def resolve_roles(self, record, ctx, args):
-        roles = []
-        for x in record:
-            role = ctx.guild.get_role(x)
-            if role:
-                roles.append(role)
-            continue
-        role_names = [r.name for r in roles]
+        index = self.get_role_index(ctx.guild, record.toggleroles)
 
         resolved = []
         unresolved = []
@@ -58,16 +83,12 @@ class Roles(LightningCog):
             try:
                 role = await commands.RoleConverter().convert(ctx, argument)
             except commands.BadArgument:
-                name = process.extractOne(argument, role_names, score_cutoff=75)
-                if name is None:
+                match = index.search(argument, score_cutoff=75)
+                if match is None:
                     unresolved.append(argument)
                     continue
 
-                role = discord.utils.get(roles, name=name[0])
-
-                if not role:
-                    unresolved.append(argument)
-                    continue
+                role = match[1]
             resolved.append(role)
         return resolved, unresolved
 
@@ -94,10 +115,10 @@ class Roles(LightningCog):
                 await ctx.send('That role is higher than my highest role.')
                 return
 
-            if role in member.roles and role.id in record:
+            if role in member.roles and role.id in record.toggleroles:
                 diff_roles[0].append(role)
                 paginator.add_line(f"Removed role **{role.name}**")
-            elif role not in member.roles and role.id in record:
+            elif role not in member.roles and role.id in record.toggleroles:
                 diff_roles[1].append(role)
                 paginator.add_line(f"Added role **{role.name}**")
             else:
@@ -173,7 +194,7 @@ class Roles(LightningCog):
         unresolved = []
         role_list = []
 
-        for role_id in record:
+        for role_id in record.toggleroles:
             role = discord.utils.get(ctx.guild.roles, id=role_id)
             if role:
                 role_list.append(f"{role.mention} (ID: {role.id})")
@@ -24,7 +24,6 @@ from discord.ext import commands
 
 from lightning import errors
 from lightning.utils.helpers import ConfirmationMenu, Emoji, haste
-from lightning.utils.helpers import request as make_request
 
 
 class LightningContext(commands.Context):
@@ -67,5 +66,11 @@ class LightningContext(commands.Context):
                     return await super().send(content, file=discord.File(fp, filename='message_too_long.txt'))
         return await super().send(content, *args, **kwargs)
 
-    async def request(self, url, **kwargs) -> Union[dict, str, bytes]:
-        return await make_request(url, self.bot.aiosession, **kwargs)
+    async def request(self, url, *, cache=False, **kwargs) -> Union[dict, str, bytes]:
+        """Makes a request to a third-party API.
+
+        If cache is True, GET requests go through the bot's HTTP cache. A ttl keyword can be passed along with it.
+        """
+        if cache:
+            return await self.bot.http_cache.request(url, **kwargs)
+        return await self.bot.http_client.request(url, **kwargs)
@@ -24,6 +24,7 @@ from discord.ext import commands
 from lightning.commands import CommandLevel
 from lightning.errors import (ChannelPermissionFailure, HierarchyException,
                               InvalidLevelArgument, LightningError)
+from lightning.utils.time import ShortTime
 
 log = logging.getLogger(__name__)
 
@@ -251,6 +252,29 @@ class Message(commands.Converter):
         return message_id, channel
 
 
+class Regex(commands.Converter):
+    async def convert(self, ctx, argument):
+        try:
+            return re.compile(argument)
+        except re.error as e:
+            raise commands.BadArgument(f"Invalid regex: {e}")
+
+
+class SnowflakeOrPastTime(commands.Converter):
+    """Converts either a snowflake or a short time (e.g. "30m") into a datetime in the past"""
+    async def convert(self, ctx, argument):
+        if argument.isdigit():
+            return discord.utils.snowflake_time(int(argument))
+
+        now = ctx.message.created_at
+        try:
+            future = ShortTime(argument, now=now)
+        except commands.BadArgument:
+            raise commands.BadArgument(f"\"{argument}\" is not a valid ID or a time like \"30m\"")
+
+        return now - (future.dt - now)
+
+
 class GuildID(commands.Converter):
     async def convert(self, ctx, argument):
         if not argument.isdigit():
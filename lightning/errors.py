@@ -96,6 +96,12 @@ class HTTPRatelimited(HTTPException):
     pass
 
 
+class HTTPUnavailable(LightningError):
+    def __init__(self, host: str):
+        self.host = host
+        super().__init__(f"{host} is currently unavailable. Please try again later.")
+
+
 class HierarchyException(LightningError):
     def __init__(self, thing):
         super().__init__(f"{thing} is higher than your highest {thing}")
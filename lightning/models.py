@@ -15,7 +15,7 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 from datetime import datetime
-from typing import Union
+from typing import List, Union
 
 import attr
 import discord
@@ -70,20 +70,35 @@ class GuildModConfig:
         return role
 
 
+class LoggingChannel:
+    __slots__ = ('channel_id', 'format', 'types')
+
+    def __init__(self, channel_id: int, format: str, types):
+        self.channel_id = channel_id
+        self.format = format
+        self.types = frozenset(types or ())
+
+    def __repr__(self):
+        return f"<LoggingChannel channel_id={self.channel_id} format={self.format!r}>"
+
+
 class LoggingConfig:
-    __slots__ = ('logging')
+    __slots__ = ('logging', 'features')
 
     def __init__(self, records):
         self.logging = {}
+        features = {}
         for record in records:
-            self.logging[record['channel_id']] = {"types": record['types'], "format": record['format']}
+            channel = LoggingChannel(record['channel_id'], record['format'], record['types'])
+            self.logging[channel.channel_id] = channel
+            for feature in channel.types:
+                features.setdefault(feature, []).append((channel.channel_id, channel))
 
-    def get_channels_with_feature(self, feature) -> list:
-        channels = []
-        for key, value in list(self.logging.items()):
-            if feature in value['types']:
-                channels.append((key, value))
-        return channels
+        # Lookups happen on every logged event so everything is indexed by feature ahead of time.
+        self.features = {feature: tuple(channels) for feature, channels in features.items()}
+
+    def get_channels_with_feature(self, feature) -> tuple:
+        return self.features.get(feature, ())
 
     def get(self, key):
         return self.logging.get(key, None)
@@ -273,6 +288,15 @@ def to_action(value):
     return a
 
 
+# Keeps infraction_counts in sync with the rows an "inserted" CTE returns.
+INFRACTION_COUNTS_CTE = """counted AS (
+                        INSERT INTO infraction_counts (guild_id, user_id, action, count)
+                        SELECT guild_id, user_id, action, COUNT(*) FROM inserted GROUP BY guild_id, user_id, action
+                        ON CONFLICT (guild_id, user_id, action)
+                        DO UPDATE SET count = infraction_counts.count + EXCLUDED.count
+                    )"""
+
+
 class Action:
     def __init__(self, guild_id: int, action: Union[modlogformats.ActionType, str],
                  target: Union[discord.Member, discord.User, int],
@@ -287,18 +311,55 @@ class Action:
         self.timestamp = self.kwargs.pop("timestamp", datetime.utcnow())
 
     async def add_infraction(self, connection) -> int:
-        if len(self.kwargs) == 0:
-            query = """INSERT INTO infractions (guild_id, user_id, moderator_id, action, reason, created_at, expiry)
-                       VALUES ($1, $2, $3, $4, $5, $6, $7)
-                       RETURNING id;"""
-            return await connection.fetchval(query, self.guild_id, self.target.id, self.moderator.id, self.action.value,
-                                             self.reason, self.timestamp, self.expiry)
-        else:
-            query = """INSERT INTO infractions (guild_id, user_id, moderator_id, action, reason, created_at, expiry, extra)
-                       VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
-                       RETURNING id;"""
-            return await connection.fetchval(query, self.guild_id, self.target.id, self.moderator.id, self.action.value,
-                                             self.reason, self.timestamp, self.expiry, self.kwargs)
+        query = f"""WITH inserted AS (
+                        INSERT INTO infractions (guild_id, user_id, moderator_id, action, reason, created_at, expiry,
+                                                 extra)
+                        VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+                        RETURNING id, guild_id, user_id, action
+                    ), {INFRACTION_COUNTS_CTE}
+                    SELECT id FROM inserted;"""
+        return await connection.fetchval(query, self.guild_id, self.target.id, self.moderator.id, self.action.value,
+                                         self.reason, self.timestamp, self.expiry, self.kwargs or None)
+
+    @staticmethod
+    async def add_infractions(connection, actions: list) -> List[int]:
+        """Inserts many infractions with a single query.
+
+        Parameters
+        ----------
+        connection
+            The connection to use
+        actions : list
+            A list of :class:`Action` to insert
+
+        Returns
+        -------
+        List[int]
+            The IDs of the inserted infractions, in the same order as the actions.
+        """
+        query = f"""WITH inserted AS (
+                        INSERT INTO infractions (guild_id, user_id, moderator_id, action, reason, created_at, expiry,
+                                                 extra)
+                        SELECT * FROM unnest($1::bigint[], $2::bigint[], $3::bigint[], $4::int[], $5::text[],
+                                             $6::timestamp[], $7::timestamp[], $8::jsonb[])
+                        RETURNING id, guild_id, user_id, action
+                    ), {INFRACTION_COUNTS_CTE}
+                    SELECT id FROM inserted ORDER BY id;"""
+        columns = ([], [], [], [], [], [], [], [])
+        for action in actions:
+            row = (action.guild_id, action.target.id, action.moderator.id, action.action.value, action.reason,
+                   action.timestamp, action.expiry, action.kwargs or None)
+            for column, value in zip(columns, row):
+                column.append(value)
+
+        records = await connection.fetch(query, *columns)
+        return [record['id'] for record in records]
+
+    @staticmethod
+    async def get_infraction_count(connection, guild_id: int, user_id: int, action) -> int:
+        """Gets how many infractions of an action a user has"""
+        query = "SELECT count FROM infraction_counts WHERE guild_id=$1 AND user_id=$2 AND action=$3;"
+        return await connection.fetchval(query, guild_id, user_id, action.value) or 0
 
     @property
     def event(self):
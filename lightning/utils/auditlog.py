@@ -0,0 +1,231 @@
+"""
+Lightning.py - A personal Discord bot
+Copyright (C) 2019-2021 LightSage
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation at version 3 of the License.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, Tuple
+
+import discord
+
+log = logging.getLogger(__name__)
+
+
+class AuditLogTail:
+    """Keeps the most recent audit log entries of a guild in memory.
+
+    Concurrent lookups share one fetch and only entries newer than the last one seen are kept.
+
+    Parameters
+    ----------
+    guild : discord.Guild
+        The guild to keep audit log entries for
+    size : int, optional
+        The maximum amount of entries to keep, by default 200
+    delay : float, optional
+        How long to wait before fetching so that events close together share the fetch, by default 0.5
+    """
+
+    def __init__(self, guild: discord.Guild, *, size: int = 200, delay: float = 0.5):
+        self.guild = guild
+        self.delay = delay
+        self.entries = deque(maxlen=size)
+        self.index: Dict[Tuple[discord.AuditLogAction, Optional[int]], deque] = {}
+        self.last_id: Optional[int] = None
+        self._fetch_task: Optional[asyncio.Task] = None
+        self._fetch_scheduled_at = 0.0
+
+    @staticmethod
+    def _key(entry: discord.AuditLogEntry) -> tuple:
+        return entry.action, getattr(entry.target, 'id', None)
+
+    def _add(self, entry: discord.AuditLogEntry) -> None:
+        if len(self.entries) == self.entries.maxlen:
+            old = self.entries.popleft()
+            bucket = self.index.get(self._key(old))
+            if bucket:
+                bucket.popleft()
+                if not bucket:
+                    del self.index[self._key(old)]
+
+        self.entries.append(entry)
+        self.index.setdefault(self._key(entry), deque()).append(entry)
+
+    async def _fetch(self) -> None:
+        await asyncio.sleep(self.delay)
+        entries = []
+        # Entries are newest first. On the first fetch one page (100 entries) is enough, after that keep paging
+        # back to the last entry we've seen so bursts don't lose anything. Anything past the cache's size would
+        # be dropped right away, so there's no point in fetching it.
+        limit = 100 if self.last_id is None else self.entries.maxlen
+        async for entry in self.guild.audit_logs(limit=limit):
+            if self.last_id is not None and entry.id <= self.last_id:
+                break
+            entries.append(entry)
+
+        for entry in reversed(entries):
+            self._add(entry)
+            self.last_id = entry.id
+
+    def _pending_fetch(self) -> Optional[asyncio.Task]:
+        if self._fetch_task is None or self._fetch_task.done():
+            return None
+        return self._fetch_task
+
+    async def _wait(self, task: asyncio.Task) -> None:
+        try:
+            await asyncio.shield(task)
+        except discord.HTTPException as e:
+            log.debug(f"Failed to fetch audit logs for {self.guild.id}: {e}")
+
+    async def refresh(self, since: Optional[float] = None) -> None:
+        """Fetches new entries.
+
+        A pending fetch is shared if it was scheduled at or after since (a time.monotonic() value, by default now),
+        so every caller gets the full delay for the audit log to catch up.
+        """
+        if since is None:
+            since = time.monotonic()
+
+        while True:
+            task = self._pending_fetch()
+            if task is None:
+                task = self._fetch_task = asyncio.ensure_future(self._fetch())
+                self._fetch_scheduled_at = time.monotonic()
+                break
+
+            if self._fetch_scheduled_at >= since:
+                break
+
+            # This fetch could be sent too early to include what we're looking for,
+            # so let it finish and then share or schedule a newer one.
+            await self._wait(task)
+
+        await self._wait(task)
+
+    def lookup(self, action: discord.AuditLogAction, target_id: int, *, check: Callable = None,
+               max_age: Optional[float] = None) -> Optional[discord.AuditLogEntry]:
+        """Finds the newest cached entry for an action done to a target"""
+        bucket = self.index.get((action, target_id))
+        if not bucket:
+            return None
+
+        now = datetime.utcnow()
+        for entry in reversed(bucket):
+            if max_age is not None and now - entry.created_at > timedelta(seconds=max_age):
+                break
+            if check is None or check(entry):
+                return entry
+        return None
+
+    async def find(self, action: discord.AuditLogAction, target_id: int, *, check: Callable = None,
+                   max_age: Optional[float] = None, retry_after: float = 2.0) -> Optional[discord.AuditLogEntry]:
+        """Finds an entry, fetching new entries if it isn't cached yet.
+
+        Parameters
+        ----------
+        action : discord.AuditLogAction
+            The audit log action to look for
+        target_id : int
+            The ID of the target of the action
+        check : Callable, optional
+            An additional check the entry has to pass
+        max_age : float, optional
+            The maximum age of the entry in seconds
+        retry_after : float, optional
+            The audit log can lag behind gateway events, so one more fetch is done after this long, by default 2.0
+
+        Returns
+        -------
+        Optional[discord.AuditLogEntry]
+            The entry if one was found
+        """
+        since = time.monotonic()
+        entry = self.lookup(action, target_id, check=check, max_age=max_age)
+        if entry is not None:
+            return entry
+
+        task = self._pending_fetch()
+        if task is not None and self._fetch_scheduled_at < since:
+            # An older fetch could still have it
+            await self._wait(task)
+            entry = self.lookup(action, target_id, check=check, max_age=max_age)
+            if entry is not None:
+                return entry
+
+        await self.refresh(since)
+        entry = self.lookup(action, target_id, check=check, max_age=max_age)
+        if entry is not None or not retry_after:
+            return entry
+
+        await asyncio.sleep(retry_after)
+        await self.refresh()
+        entry = self.lookup(action, target_id, check=check, max_age=max_age)
+        if entry is not None:
+            return entry
+
+        # A burst bigger than the cache could have pushed it out already
+        return await self._direct_lookup(action, target_id, check=check, max_age=max_age)
+
+    async def _direct_lookup(self, action: discord.AuditLogAction, target_id: int, *, check: Callable = None,
+                             max_age: Optional[float] = None) -> Optional[discord.AuditLogEntry]:
+        now = datetime.utcnow()
+        # max_age stops the paging, otherwise only look as far back as the cache could have
+        limit = None if max_age is not None else self.entries.maxlen
+        try:
+            async for entry in self.guild.audit_logs(limit=limit, action=action):
+                if max_age is not None and now - entry.created_at > timedelta(seconds=max_age):
+                    break
+                if getattr(entry.target, 'id', None) == target_id and (check is None or check(entry)):
+                    return entry
+        except discord.HTTPException as e:
+            log.debug(f"Failed to fetch audit logs for {self.guild.id}: {e}")
+        return None
+
+
+class AuditLogCache:
+    """Holds an :class:`AuditLogTail` for each guild"""
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.tails: Dict[int, AuditLogTail] = {}
+
+    def get(self, guild: discord.Guild) -> AuditLogTail:
+        tail = self.tails.get(guild.id)
+        if tail is None:
+            tail = self.tails[guild.id] = AuditLogTail(guild, **self.kwargs)
+        else:
+            # Guild objects can be replaced (e.g. after an outage)
+            tail.guild = guild
+        return tail
+
+    def remove(self, guild_id: int) -> None:
+        tail = self.tails.pop(guild_id, None)
+        if tail is not None and tail._fetch_task is not None:
+            tail._fetch_task.cancel()
+
+    async def find(self, guild: discord.Guild, action: discord.AuditLogAction, target_id: int,
+                   **kwargs) -> Optional[discord.AuditLogEntry]:
+        if not guild.me.guild_permissions.view_audit_log:
+            return None
+
+        return await self.get(guild).find(action, target_id, **kwargs)
+
+    def clear(self) -> None:
+        for guild_id in list(self.tails):
+            self.remove(guild_id)
@@ -0,0 +1,172 @@
+"""
+Lightning.py - A personal Discord bot
+Copyright (C) 2019-2021 LightSage
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation at version 3 of the License.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import asyncio
+import logging
+import os
+import threading
+from typing import Optional, Union
+
+import aiohttp
+import discord
+
+from lightning.cache import ByteLRU
+from lightning.errors import LightningError
+
+log = logging.getLogger(__name__)
+
+# Sizes that Discord's CDN accepts
+AVATAR_SIZES = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+
+
+def smallest_avatar_size(needed: int) -> int:
+    """Gets the smallest avatar size the CDN serves that is at least the size needed"""
+    for size in AVATAR_SIZES:
+        if size >= needed:
+            return size
+    return AVATAR_SIZES[-1]
+
+
+class AvatarCache:
+    """Caches avatar PNGs by user ID, avatar hash, and size.
+
+    Avatars are kept in memory up to a total amount of bytes and can optionally be kept on disk too.
+    The disk has its own byte budget, and the least recently used files are removed when it's exceeded.
+
+    Parameters
+    ----------
+    session : aiohttp.ClientSession
+        The session to download avatars with
+    max_bytes : int, optional
+        The maximum amount of bytes to keep in memory, by default 32 MiB
+    directory : Optional[str], optional
+        A directory to also keep avatars in. If not given, avatars are only kept in memory.
+    disk_max_bytes : int, optional
+        The maximum amount of bytes to keep in the directory, by default 256 MiB
+    """
+
+    def __init__(self, session: aiohttp.ClientSession, *, max_bytes: int = 32 * 1024 * 1024,
+                 directory: Optional[str] = None, disk_max_bytes: int = 256 * 1024 * 1024):
+        self.session = session
+        self.memory = ByteLRU(max_bytes)
+        self.directory = directory
+        self.disk_max_bytes = disk_max_bytes
+        # Counted on the first write so startup doesn't have to scan the directory
+        self.disk_size: Optional[int] = None
+        # Disk access happens in executor threads
+        self._disk_lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(user: Union[discord.User, discord.Member], size: int) -> tuple:
+        # Avatar hashes change whenever the avatar does, so old entries just age out
+        avatar = user.avatar or f"default{user.default_avatar.value}"
+        return user.id, avatar, size
+
+    def _path(self, key: tuple) -> str:
+        return os.path.join(self.directory, "{0}_{1}_{2}.png".format(*key))
+
+    def _read_disk(self, key: tuple) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as fp:
+                data = fp.read()
+            # The modification time is what pruning goes by, so bump it to mark the file as recently used
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def _scan_disk(self) -> list:
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith('.png') and entry.is_file():
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _prune_disk(self) -> None:
+        # Prune below the budget so we aren't scanning the directory on every write
+        target = self.disk_max_bytes * 0.9
+        for _, size, path in sorted(self._scan_disk()):
+            if self.disk_size <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.disk_size -= size
+
+    def _write_disk(self, key: tuple, data: bytes) -> None:
+        path = self._path(key)
+        with self._disk_lock:
+            try:
+                if self.disk_size is None:
+                    self.disk_size = sum(size for _, size, _ in self._scan_disk())
+
+                try:
+                    self.disk_size -= os.path.getsize(path)
+                except OSError:
+                    pass
+
+                with open(path, 'wb') as fp:
+                    fp.write(data)
+                self.disk_size += len(data)
+
+                if self.disk_size > self.disk_max_bytes:
+                    self._prune_disk()
+            except OSError as e:
+                log.warning(f"Unable to write avatar to disk: {e}")
+
+    async def get(self, user: Union[discord.User, discord.Member], size: int) -> bytes:
+        """Gets a user's avatar as PNG bytes.
+
+        Parameters
+        ----------
+        user : Union[discord.User, discord.Member]
+            The user to get the avatar of
+        size : int
+            The minimum size in pixels that's needed. The smallest size the CDN serves that fits is requested.
+
+        Returns
+        -------
+        bytes
+            The avatar
+        """
+        size = smallest_avatar_size(size)
+        key = self.key(user, size)
+        data = self.memory.get(key)
+        if data is not None:
+            return data
+
+        loop = asyncio.get_event_loop()
+        if self.directory:
+            data = await loop.run_in_executor(None, self._read_disk, key)
+            if data is not None:
+                self.memory[key] = data
+                return data
+
+        async with self.session.get(str(user.avatar_url_as(format="png", size=size))) as resp:
+            if resp.status != 200:
+                raise LightningError(f"Unable to download avatar (status code {resp.status})")
+            data = await resp.read()
+
+        self.memory[key] = data
+        if self.directory:
+            await loop.run_in_executor(None, self._write_disk, key, data)
+        return data
@@ -0,0 +1,120 @@
+"""
+Lightning.py - A personal Discord bot
+Copyright (C) 2019-2021 LightSage
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation at version 3 of the License.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from typing import Dict, Iterable, List, Optional, Set
+
+import discord
+
+NGRAM_SIZE = 3
+
+
+def ngrams(text: str) -> Set[str]:
+    return {text[i:i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1)}
+
+
+class EmojiIndex:
+    """An index of the emojis in a set of guilds.
+
+    Exact names are looked up in a dict and substring searches only check emojis that share
+    every trigram with the query.
+
+    Parameters
+    ----------
+    guild_ids : Iterable[int]
+        The IDs of the guilds whose emojis can be indexed
+    """
+
+    def __init__(self, guild_ids: Iterable[int] = ()):
+        self.guild_ids = set(guild_ids)
+        self.emojis: Dict[int, discord.Emoji] = {}
+        self.by_guild: Dict[int, Set[int]] = {}
+        self.names: Dict[str, Set[int]] = {}
+        self.grams: Dict[str, Set[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.emojis)
+
+    def _add_emoji(self, emoji: discord.Emoji) -> None:
+        self.emojis[emoji.id] = emoji
+        self.by_guild.setdefault(emoji.guild_id, set()).add(emoji.id)
+        self.names.setdefault(emoji.name, set()).add(emoji.id)
+        for gram in ngrams(emoji.name.lower()):
+            self.grams.setdefault(gram, set()).add(emoji.id)
+
+    def _discard(self, mapping: dict, key, emoji_id: int) -> None:
+        ids = mapping.get(key)
+        if ids is None:
+            return
+
+        ids.discard(emoji_id)
+        if not ids:
+            del mapping[key]
+
+    def _remove_emoji(self, emoji_id: int) -> None:
+        emoji = self.emojis.pop(emoji_id, None)
+        if emoji is None:
+            return
+
+        self._discard(self.by_guild, emoji.guild_id, emoji_id)
+        self._discard(self.names, emoji.name, emoji_id)
+        for gram in ngrams(emoji.name.lower()):
+            self._discard(self.grams, gram, emoji_id)
+
+    def add_guild(self, guild: discord.Guild) -> None:
+        """Indexes (or reindexes) a guild's emojis if the guild is approved"""
+        self.remove_guild(guild.id)
+        if guild.id not in self.guild_ids:
+            return
+
+        for emoji in guild.emojis:
+            self._add_emoji(emoji)
+
+    def remove_guild(self, guild_id: int) -> None:
+        for emoji_id in list(self.by_guild.get(guild_id, ())):
+            self._remove_emoji(emoji_id)
+
+    def approve(self, guild: discord.Guild) -> None:
+        self.guild_ids.add(guild.id)
+        self.add_guild(guild)
+
+    def rebuild(self, guilds: Iterable[discord.Guild]) -> None:
+        self.emojis.clear()
+        self.by_guild.clear()
+        self.names.clear()
+        self.grams.clear()
+        for guild in guilds:
+            self.add_guild(guild)
+
+    def get(self, name: str) -> Optional[discord.Emoji]:
+        """Gets an emoji by its exact name"""
+        ids = self.names.get(name)
+        if not ids:
+            return None
+        # Prefer the oldest emoji so the result is stable between calls
+        return self.emojis[min(ids)]
+
+    def search(self, query: str) -> List[discord.Emoji]:
+        """Finds every emoji whose name contains the query, ignoring case"""
+        query = query.lower()
+        grams = ngrams(query)
+        if not grams:
+            # Too short to have a trigram, so every emoji is a candidate
+            candidates = self.emojis.keys()
+        else:
+            postings = sorted((self.grams.get(gram, set()) for gram in grams), key=len)
+            candidates = set.intersection(*postings)
+
+        return [emoji for emoji in map(self.emojis.__getitem__, candidates) if query in emoji.name.lower()]
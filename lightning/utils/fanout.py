@@ -0,0 +1,141 @@
+"""
+Lightning.py - A personal Discord bot
+Copyright (C) 2019-2021 LightSage
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation at version 3 of the License.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Iterable
+
+import discord
+
+log = logging.getLogger(__name__)
+
+
+def get_retry_after(error: discord.HTTPException, *, default: float = 1.0) -> float:
+    """Gets how long to wait before retrying a ratelimited request.
+
+    Parameters
+    ----------
+    error : discord.HTTPException
+        The exception that was raised from the ratelimited request
+    default : float, optional
+        The amount of seconds to wait if the response has no ratelimit headers, by default 1.0
+
+    Returns
+    -------
+    float
+        How long to wait in seconds
+    """
+    headers = getattr(error.response, 'headers', None) or {}
+    for header in ('Retry-After', 'X-RateLimit-Reset-After'):
+        try:
+            return float(headers[header])
+        except (KeyError, ValueError):
+            continue
+    return default
+
+
+class FanOutResult:
+    __slots__ = ('sent', 'dead', 'failed')
+
+    def __init__(self):
+        self.sent = []
+        self.dead = []
+        self.failed = []
+
+    def __repr__(self):
+        return f"<FanOutResult sent={len(self.sent)} dead={len(self.dead)} failed={len(self.failed)}>"
+
+
+class FanOut:
+    """Sends something to many targets concurrently with a bounded amount of workers.
+
+    Parameters
+    ----------
+    workers : int, optional
+        The maximum amount of sends that can happen at once, by default 10
+    retries : int, optional
+        How many times a send is retried when ratelimited or when Discord has a server error, by default 3
+    dead_exceptions : tuple, optional
+        Exceptions that mark a target as dead (i.e. deleted webhooks or channels we can't send to).
+    """
+
+    def __init__(self, *, workers: int = 10, retries: int = 3,
+                 dead_exceptions: tuple = (discord.NotFound, discord.Forbidden)):
+        self.workers = workers
+        self.retries = retries
+        self.dead_exceptions = dead_exceptions
+
+    async def _deliver(self, target: Any, send: Callable[[Any], Awaitable], result: FanOutResult) -> None:
+        for attempt in range(self.retries + 1):
+            try:
+                await send(target)
+            except self.dead_exceptions:
+                result.dead.append(target)
+                return
+            except discord.HTTPException as e:
+                if attempt >= self.retries:
+                    result.failed.append(target)
+                    return
+
+                if e.status == 429:
+                    await asyncio.sleep(get_retry_after(e))
+                elif e.status >= 500:
+                    # discord heckin died
+                    await asyncio.sleep(2 ** attempt)
+                else:
+                    result.failed.append(target)
+                    return
+            except Exception as e:
+                log.error(f"Unexpected error while sending to {target!r}", exc_info=e)
+                result.failed.append(target)
+                return
+            else:
+                result.sent.append(target)
+                return
+
+    async def _worker(self, queue: asyncio.Queue, send: Callable[[Any], Awaitable], result: FanOutResult) -> None:
+        while True:
+            try:
+                target = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+
+            await self._deliver(target, send, result)
+
+    async def run(self, targets: Iterable[Any], send: Callable[[Any], Awaitable]) -> FanOutResult:
+        """Calls send for every target and waits for all of them to finish.
+
+        Parameters
+        ----------
+        targets : Iterable[Any]
+            The targets to send to
+        send : Callable[[Any], Awaitable]
+            A coroutine function that takes a target and sends to it.
+
+        Returns
+        -------
+        FanOutResult
+            The targets sorted by whether they were sent to, are dead, or failed.
+        """
+        queue = asyncio.Queue()
+        for target in targets:
+            queue.put_nowait(target)
+
+        result = FanOutResult()
+        workers = min(self.workers, queue.qsize())
+        if workers:
+            await asyncio.gather(*(self._worker(queue, send, result) for _ in range(workers)))
+        return result
@@ -0,0 +1,80 @@
+"""
+Lightning.py - A personal Discord bot
+Copyright (C) 2019-2021 LightSage
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation at version 3 of the License.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from typing import Any, Callable, Iterable, Optional, Tuple
+
+from rapidfuzz import fuzz, process
+from rapidfuzz.utils import default_process
+
+
+class FuzzyIndex:
+    """A prebuilt index for fuzzy matching against a set of strings that rarely changes.
+
+    The strings are normalized once when the index is built instead of on every search.
+
+    Parameters
+    ----------
+    choices : Iterable[Tuple[str, Any]]
+        Pairs of the string to match against and the value to return for it
+    """
+
+    __slots__ = ('values', 'processed', 'exact')
+
+    def __init__(self, choices: Iterable[Tuple[str, Any]]):
+        self.values = []
+        # rapidfuzz returns the key for mappings, which gives us the index back regardless of version
+        self.processed = {}
+        self.exact = {}
+        for index, (name, value) in enumerate(choices):
+            normalized = default_process(name)
+            self.values.append((name, value))
+            self.processed[index] = normalized
+            self.exact.setdefault(normalized, index)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def search(self, query: str, *, scorer: Callable = fuzz.WRatio,
+               score_cutoff: float = 0) -> Optional[Tuple[str, Any, float]]:
+        """Finds the best match for a query.
+
+        Parameters
+        ----------
+        query : str
+            The string to search for
+        scorer : Callable, optional
+            The rapidfuzz scorer to use, by default fuzz.WRatio
+        score_cutoff : float, optional
+            The minimum score of a match, by default 0
+
+        Returns
+        -------
+        Optional[Tuple[str, Any, float]]
+            The matched string, its value, and the score. None if nothing matched well enough.
+        """
+        normalized = default_process(query)
+        index = self.exact.get(normalized)
+        if index is None:
+            result = process.extractOne(normalized, self.processed, scorer=scorer, processor=None,
+                                        score_cutoff=score_cutoff)
+            if not result:
+                return None
+            score, index = result[1], result[2]
+        else:
+            score = 100
+
+        name, value = self.values[index]
+        return name, value, score
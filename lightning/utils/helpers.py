@@ -16,10 +16,12 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 import asyncio
 import datetime
-import io
+import gzip
+import html
 import json
 import logging
 import subprocess
+import tempfile
 import typing
 
 import aiohttp
@@ -33,36 +35,132 @@ from lightning import errors
 log = logging.getLogger(__name__)
 
 
-async def archive_messages(channel: discord.TextChannel, limit: int, *, filename=None) -> discord.File:
-    """Makes a txt file containing the limit of messages specified.
+ARCHIVE_FORMATS = ('txt', 'md', 'jsonl', 'html')
+# Archives bigger than this are written to a temporary file instead of kept in memory
+ARCHIVE_SPOOL_SIZE = 4 * 1024 * 1024
+# Messages are encoded and written in batches of this size
+ARCHIVE_BATCH_SIZE = 100
+
+
+def _format_archive_header(channel: discord.TextChannel, fmt: str) -> str:
+    title = f"Archive of {channel} (ID: {channel.id}) made on {datetime.datetime.utcnow()}"
+    if fmt == "html":
+        return f"<!DOCTYPE html>\n<html>\n<head><meta charset=\"utf-8\"><title>{html.escape(title)}</title></head>\n" \
+               f"<body>\n<h1>{html.escape(title)}</h1>\n"
+    if fmt == "jsonl":
+        return ""
+    return f"{title}\n\n\n"
+
+
+def _format_archive_message(message: discord.Message, fmt: str) -> str:
+    if fmt == "jsonl":
+        data = {"id": message.id, "author": str(message.author), "author_id": message.author.id,
+                "created_at": message.created_at.isoformat(), "content": message.clean_content,
+                "attachments": [attach.url for attach in message.attachments]}
+        return json.dumps(data) + "\n"
+
+    if fmt == "html":
+        attachments = "".join(f'<br><a href="{html.escape(attach.url)}">{html.escape(attach.filename)}</a>'
+                              for attach in message.attachments)
+        return f"<p><b>[{message.created_at}] {html.escape(str(message.author))}</b>: " \
+               f"{html.escape(message.clean_content)}{attachments}</p>\n"
+
+    if fmt == "md":
+        text = f"[{message.created_at}]: {message.author} - {message.clean_content}\n"
+        text += "".join(f"[{attach.filename}]({attach.url})\n" for attach in message.attachments)
+        return text + "\n"
+
+    text = f"[{message.created_at}]: {message.author} - {message.clean_content}"
+    if message.attachments:
+        return text + "".join(f"{attach.url}\n" for attach in message.attachments)
+    return text + "\n"
+
+
+def _write_archive_batch(out: typing.BinaryIO, chunks: typing.List[str]) -> None:
+    """Encodes formatted chunks and writes them to the archive.
+
+    This is blocking and should be ran in an executor."""
+    out.write("".join(chunks).encode('utf-8'))
+
+
+async def write_archive(channel: discord.TextChannel, fp: typing.BinaryIO, limit: int, *, fmt: str = "txt",
+                        compress: bool = False) -> int:
+    """Writes a channel's messages into a binary file as they're fetched.
 
     Parameters
     ----------
-    ctx : Context
-        The context that invoked the command.
+    channel : discord.TextChannel
+        The channel to archive
+    fp : typing.BinaryIO
+        The file to write to. This is not closed.
+    limit : int
+        How many messages to archive
+    fmt : str
+        The format to write, one of txt, md, jsonl or html.
+    compress : bool
+        Whether to gzip compress the archive
+
+    Returns
+    -------
+    int
+        The amount of messages that were written
+    """
+    if fmt not in ARCHIVE_FORMATS:
+        raise ValueError(f"Unknown archive format {fmt}")
+
+    loop = asyncio.get_event_loop()
+    # GzipFile doesn't close a file object that's passed to it
+    out = gzip.GzipFile(fileobj=fp, mode='wb') if compress else fp
+    count = 0
+    try:
+        batch = [_format_archive_header(channel, fmt)]
+        async for message in channel.history(limit=limit):
+            batch.append(_format_archive_message(message, fmt))
+            count += 1
+            if len(batch) >= ARCHIVE_BATCH_SIZE:
+                await loop.run_in_executor(None, _write_archive_batch, out, batch)
+                batch = []
+
+        if fmt == "html":
+            batch.append("</body>\n</html>\n")
+
+        if batch:
+            await loop.run_in_executor(None, _write_archive_batch, out, batch)
+    finally:
+        if compress:
+            await loop.run_in_executor(None, out.close)
+
+    return count
+
+
+async def archive_messages(channel: discord.TextChannel, limit: int, *, filename=None, fmt: str = "txt",
+                           compress: bool = False) -> discord.File:
+    """Makes a file containing the limit of messages specified.
+
+    Parameters
+    ----------
+    channel : discord.TextChannel
+        The channel to archive
     limit : int
         How many messages to search for
     filename : None, Optional
         Optional file name
+    fmt : str
+        The format of the archive, one of txt, md, jsonl or html.
+    compress : bool
+        Whether to gzip compress the archive
 
     Returns
     -------
     :class:discord.File
-        A .txt file containing the messages
+        A file containing the messages
     """
-    logtext = f"Archive of {channel} (ID: {channel.id}) "\
-              f"made on {datetime.datetime.utcnow()}\n\n\n"
-    async for log in channel.history(limit=limit):
-        logtext += f"[{log.created_at}]: {log.author} - {log.clean_content}"
-        if log.attachments:
-            for attach in log.attachments:
-                logtext += f"{attach.url}\n"
-        else:
-            logtext += "\n"
-    txtlog = io.StringIO()
-    txtlog.write(logtext)
-    txtlog.seek(0)
-    return discord.File(txtlog, filename=filename or f"message_archive_{str(channel)}.txt")
+    fp = tempfile.SpooledTemporaryFile(max_size=ARCHIVE_SPOOL_SIZE)
+    await write_archive(channel, fp, limit, fmt=fmt, compress=compress)
+    fp.seek(0)
+    if filename is None:
+        filename = f"message_archive_{str(channel)}.{fmt}{'.gz' if compress else ''}"
+    return discord.File(fp, filename=filename)
 
 
 async def message_id_lookup(bot, channel_id: int, message_id: int):
@@ -264,28 +362,103 @@ class ConfirmationMenu(menus.Menu):
         return self.result
 
 
+def raise_for_status(resp: aiohttp.ClientResponse, url) -> None:
+    if resp.status == 429:
+        log.info(f"Ratelimited while requesting {url}")
+        raise errors.HTTPRatelimited(resp)
+
+    # TODO: Make it better
+    if resp.status == 404:
+        log.info(f"404 while requesting {url}")
+        raise errors.HTTPException(resp)
+
+    if not 300 > resp.status >= 200:
+        raise errors.HTTPException(resp)
+
+
 async def request(url, session: aiohttp.ClientSession, *, timeout=180, method: str = "GET", return_text=False,
                   **kwargs) -> typing.Union[dict, str, bytes]:
     async with session.request(method, url, timeout=timeout, **kwargs) as resp:
+        raise_for_status(resp, url)
+
+        if return_text is True:
+            return await resp.text()
+
+        try:
+            return await resp.json()
+        except aiohttp.ContentTypeError:
+            return await resp.read()
+
+
+IMAGE_SIGNATURES = {"png": (b"\x89PNG\r\n\x1a\n",), "jpeg": (b"\xff\xd8\xff",), "gif": (b"GIF87a", b"GIF89a"),
+                    "bmp": (b"BM",), "webp": (b"RIFF",)}
+
+
+def sniff_image_format(data: bytes) -> typing.Optional[str]:
+    """Gets the image format from the first bytes of a file, if it's one we know about"""
+    for fmt, signatures in IMAGE_SIGNATURES.items():
+        if data.startswith(signatures):
+            if fmt == "webp" and data[8:12] != b"WEBP":
+                continue
+            return fmt
+    return None
+
+
+async def download_image(url, session: aiohttp.ClientSession, *, max_bytes: int, formats: typing.Iterable[str] = None,
+                         timeout=60) -> bytes:
+    """Downloads an image without reading more than the limit.
+
+    Parameters
+    ----------
+    url : str
+        The URL of the image
+    session : aiohttp.ClientSession
+        The session to download with
+    max_bytes : int
+        The maximum size of the image in bytes
+    formats : Iterable[str], optional
+        The image formats that are allowed. If not given, any format in IMAGE_SIGNATURES is allowed.
+    timeout : int, optional
+        How long to wait for the download, by default 60
+
+    Returns
+    -------
+    bytes
+        The image
+
+    Raises
+    ------
+    LightningError
+        Raised when the file is too large or isn't an allowed image
+    """
+    formats = tuple(formats or IMAGE_SIGNATURES.keys())
+    async with session.get(url, timeout=timeout) as resp:
         if resp.status == 429:
             log.info(f"Ratelimited while requesting {url}")
             raise errors.HTTPRatelimited(resp)
 
-        # TODO: Make it better
-        if resp.status == 404:
-            log.info(f"404 while requesting {url}")
+        if not 300 > resp.status >= 200:
             raise errors.HTTPException(resp)
 
-        if 300 > resp.status >= 200:
-            if return_text is True:
-                return await resp.text()
+        if resp.content_length is not None and resp.content_length > max_bytes:
+            raise errors.LightningError(f"That file is too large! The limit is {max_bytes // 1024} KiB.")
 
-            try:
-                return await resp.json()
-            except aiohttp.ContentTypeError:
-                return await resp.read()
-        else:
-            raise errors.HTTPException(resp)
+        data = bytearray()
+        sniffed = False
+        async for chunk in resp.content.iter_chunked(65536):
+            data.extend(chunk)
+            if len(data) > max_bytes:
+                raise errors.LightningError(f"That file is too large! The limit is {max_bytes // 1024} KiB.")
+
+            if not sniffed and len(data) >= 12:
+                if sniff_image_format(bytes(data[:12])) not in formats:
+                    raise errors.LightningError(f"That doesn't look like a {'/'.join(formats)} image!")
+                sniffed = True
+
+        if not sniffed and sniff_image_format(bytes(data)) not in formats:
+            raise errors.LightningError(f"That doesn't look like a {'/'.join(formats)} image!")
+
+    return bytes(data)
 
 
 async def haste(session: aiohttp.ClientSession, text: str, instance: str = 'https://mystb.in/'):
@@ -0,0 +1,197 @@
+"""
+Lightning.py - A personal Discord bot
+Copyright (C) 2019-2021 LightSage
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation at version 3 of the License.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, Optional, Tuple, Union
+
+from lightning.cache import ByteLRU
+from lightning.utils.helpers import raise_for_status
+from lightning.utils.httpclient import HTTPClient, HTTPResponse
+
+log = logging.getLogger(__name__)
+
+
+def parse_cache_control(header: Optional[str]) -> Dict[str, Optional[str]]:
+    directives = {}
+    if not header:
+        return directives
+
+    for directive in header.split(','):
+        name, _, value = directive.strip().partition('=')
+        if name:
+            directives[name.lower()] = value.strip('"') or None
+    return directives
+
+
+class CachedResponse:
+    __slots__ = ('body', 'content_type', 'charset', 'etag', 'last_modified', 'expires_at')
+
+    def __init__(self, body: bytes, content_type: str, charset: Optional[str], *, etag: Optional[str] = None,
+                 last_modified: Optional[str] = None, expires_at: float = 0):
+        self.body = body
+        self.content_type = content_type
+        self.charset = charset
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires_at = expires_at
+
+    def __len__(self) -> int:
+        # ByteLRU sizes its entries by their length
+        return len(self.body)
+
+    @property
+    def fresh(self) -> bool:
+        return time.monotonic() < self.expires_at
+
+    @property
+    def revalidatable(self) -> bool:
+        return self.etag is not None or self.last_modified is not None
+
+    def decode(self, return_text: bool = False) -> Union[dict, str, bytes]:
+        """Decodes the body the same way :meth:`HTTPClient.request` would"""
+        if return_text:
+            return self.body.decode(self.charset or 'utf-8', errors='replace')
+
+        if self.content_type == 'application/json':
+            return json.loads(self.body.decode(self.charset or 'utf-8'))
+        return self.body
+
+
+class HTTPCache:
+    """An in-memory cache for GET requests to third-party APIs.
+
+    Responses are kept according to their Cache-Control header unless a TTL is given.
+    Stale responses with an ETag or Last-Modified header are revalidated instead of downloaded again.
+    Concurrent requests for the same URL share one request.
+
+    Parameters
+    ----------
+    client : HTTPClient
+        The client to make requests with
+    max_bytes : int, optional
+        The maximum total size of the cached bodies, by default 8 MiB
+    default_ttl : float, optional
+        How long to keep responses that don't say how long they can be cached for, by default 60
+    """
+
+    def __init__(self, client: HTTPClient, *, max_bytes: int = 8 * 1024 * 1024, default_ttl: float = 60):
+        self.client = client
+        self.default_ttl = default_ttl
+        self.responses = ByteLRU(max_bytes)
+        self.revalidated = 0
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    def get_lifetime(self, resp: HTTPResponse, ttl: Optional[float]) -> Optional[float]:
+        """Gets how long a response can be used for. None means it shouldn't be stored."""
+        directives = parse_cache_control(resp.headers.get('Cache-Control'))
+        if 'no-store' in directives:
+            return None
+
+        if ttl is not None:
+            return ttl
+
+        if 'no-cache' in directives:
+            return 0
+
+        for directive in ('s-maxage', 'max-age'):
+            value = directives.get(directive)
+            if value is not None and value.isdigit():
+                return int(value)
+
+        return self.default_ttl
+
+    async def _fetch(self, url: str, cached: Optional[CachedResponse],
+                     ttl: Optional[float], timeout: float, headers: dict) -> CachedResponse:
+        headers = dict(headers)
+        if cached is not None:
+            if cached.etag is not None:
+                headers['If-None-Match'] = cached.etag
+            if cached.last_modified is not None:
+                headers['If-Modified-Since'] = cached.last_modified
+
+        resp = await self.client.send("GET", url, timeout=timeout, headers=headers)
+        if resp.status == 304 and cached is not None:
+            lifetime = self.get_lifetime(resp, ttl)
+            cached.expires_at = time.monotonic() + (lifetime or 0)
+            self.revalidated += 1
+            return cached
+
+        raise_for_status(resp, url)
+        response = CachedResponse(resp.body, resp.content_type, resp.charset, etag=resp.headers.get('ETag'),
+                                  last_modified=resp.headers.get('Last-Modified'))
+        lifetime = self.get_lifetime(resp, ttl)
+
+        if lifetime is None:
+            return response
+
+        response.expires_at = time.monotonic() + lifetime
+        if lifetime or response.revalidatable:
+            self.responses[url] = response
+        return response
+
+    async def get(self, url: str, *, ttl: Optional[float] = None,
+                  timeout: float = 30.0, headers: Optional[dict] = None) -> CachedResponse:
+        """Gets a response from the cache, requesting it if it's missing or stale.
+
+        Parameters
+        ----------
+        url : str
+            The URL to request. This is also the cache key, so query parameters should be in the URL.
+        ttl : float, optional
+            How long to keep the response for. This overrides the response's Cache-Control max-age.
+        timeout : float, optional
+            The timeout for the request, by default 30
+        headers : dict, optional
+            Extra headers to send with the request
+
+        Returns
+        -------
+        CachedResponse
+            The response
+
+        Raises
+        ------
+        HTTPException
+            The request failed
+        """
+        cached = self.responses.get(url)
+        if cached is not None and cached.fresh:
+            return cached
+
+        future = self._pending.get(url)
+        if future is None:
+            future = self._pending[url] = asyncio.ensure_future(self._fetch(url, cached, ttl, timeout, headers or {}))
+            future.add_done_callback(lambda _: self._pending.pop(url, None))
+
+        # Other callers could be waiting on the same request so don't let cancellation propagate to it.
+        return await asyncio.shield(future)
+
+    async def request(self, url: str, *, return_text=False, **kwargs) -> Union[dict, str, bytes]:
+        """A cached version of :meth:`HTTPClient.request` for GET requests"""
+        response = await self.get(url, **kwargs)
+        # Decoded per call so callers can't modify each other's results
+        return response.decode(return_text)
+
+    @property
+    def stats(self) -> Tuple[int, int, int]:
+        """The amount of cached responses, their total size and the amount of revalidated responses"""
+        return len(self.responses), self.responses.size, self.revalidated
+
+    def clear(self) -> None:
+        self.responses.clear()
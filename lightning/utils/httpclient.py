@@ -0,0 +1,270 @@
+"""
+Lightning.py - A personal Discord bot
+Copyright (C) 2019-2021 LightSage
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation at version 3 of the License.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import asyncio
+import json
+import logging
+import random
+import time
+from typing import Dict, Optional, Union
+
+import aiohttp
+from yarl import URL
+
+from lightning import errors
+from lightning.utils.helpers import raise_for_status
+
+log = logging.getLogger(__name__)
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# Requests slower than this are logged
+SLOW_REQUEST = 5.0
+
+
+class HTTPResponse:
+    """A response that has been read in full, so it doesn't hold on to a connection"""
+
+    __slots__ = ('url', 'status', 'reason', 'headers', 'body', 'content_type', 'charset')
+
+    def __init__(self, resp: aiohttp.ClientResponse, body: bytes):
+        self.url = resp.url
+        self.status = resp.status
+        self.reason = resp.reason
+        self.headers = resp.headers
+        self.body = body
+        self.content_type = resp.content_type
+        self.charset = resp.charset
+
+    def text(self) -> str:
+        return self.body.decode(self.charset or 'utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.body.decode(self.charset or 'utf-8'))
+
+
+class CircuitBreaker:
+    """Stops requests to a host after it fails too many times in a row.
+
+    Every reset_after seconds while it's open, one request is let through. The breaker closes if it succeeds.
+
+    Parameters
+    ----------
+    threshold : int, optional
+        The amount of consecutive failures that opens the breaker, by default 5
+    reset_after : float, optional
+        How long the breaker stays open, by default 60
+    """
+
+    __slots__ = ('threshold', 'reset_after', 'failures', 'opened_at')
+
+    def __init__(self, *, threshold: int = 5, reset_after: float = 60):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+
+        if time.monotonic() - self.opened_at < self.reset_after:
+            return False
+
+        # Let this request through and keep the others out until the next window
+        self.opened_at = time.monotonic()
+        return True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+class HostStats:
+    __slots__ = ('requests', 'failures', 'retries', 'total_time', 'max_time')
+
+    def __init__(self):
+        self.requests = 0
+        self.failures = 0
+        self.retries = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def record(self, elapsed: float) -> None:
+        self.requests += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+
+    @property
+    def average_time(self) -> float:
+        return self.total_time / self.requests if self.requests else 0.0
+
+
+class HTTPClient:
+    """A client for third-party APIs.
+
+    This has its own session so slow APIs can't use up the connections that webhooks need.
+    Each host gets a limited amount of concurrent requests and a circuit breaker.
+    Failed requests are retried with exponential backoff, and Retry-After is respected when it's sent.
+
+    Parameters
+    ----------
+    headers : dict, optional
+        Headers to send with every request
+    limit : int, optional
+        The maximum amount of open connections, by default 64
+    per_host : int, optional
+        The maximum amount of concurrent requests to a single host, by default 8
+    retries : int, optional
+        How many times a failed request is retried, by default 2
+    max_backoff : float, optional
+        The longest time to wait before retrying, by default 10. Requests that are told to wait longer fail instead.
+    """
+
+    def __init__(self, *, headers: Optional[dict] = None, limit: int = 64, per_host: int = 8, retries: int = 2,
+                 max_backoff: float = 10.0, breaker_threshold: int = 5, breaker_reset: float = 60.0):
+        self.headers = headers or {}
+        self.limit = limit
+        self.per_host = per_host
+        self.retries = retries
+        self.max_backoff = max_backoff
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.stats: Dict[str, HostStats] = {}
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        # Created lazily so it's made inside of the running loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.per_host, keepalive_timeout=30,
+                                             ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(headers=self.headers, connector=connector)
+        return self._session
+
+    def get_host(self, host: str):
+        semaphore = self.semaphores.get(host)
+        if semaphore is None:
+            semaphore = self.semaphores[host] = asyncio.Semaphore(self.per_host)
+            self.breakers[host] = CircuitBreaker(threshold=self.breaker_threshold, reset_after=self.breaker_reset)
+            self.stats[host] = HostStats()
+        return semaphore, self.breakers[host], self.stats[host]
+
+    def get_backoff(self, attempt: int, retries: int, resp: Optional[aiohttp.ClientResponse]) -> Optional[float]:
+        """Gets how long to wait before the next attempt. None means the request shouldn't be retried."""
+        if attempt >= retries:
+            return None
+
+        retry_after = resp.headers.get('Retry-After') if resp is not None else None
+        if retry_after is not None:
+            try:
+                delay = float(retry_after)
+            except ValueError:
+                # HTTP dates aren't worth parsing here, so fall back to the normal backoff
+                delay = None
+
+            if delay is not None:
+                return delay if delay <= self.max_backoff else None
+
+        return min(self.max_backoff, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+    async def send(self, method: str, url: Union[str, URL], *, timeout: float = 30.0, **kwargs) -> HTTPResponse:
+        """Sends a request, retrying it when it fails.
+
+        This doesn't check the status of the final response.
+
+        Raises
+        ------
+        HTTPUnavailable
+            The host's circuit breaker is open
+        aiohttp.ClientError
+            The request failed to connect
+        asyncio.TimeoutError
+            The request timed out
+        """
+        host = URL(url).host
+        semaphore, breaker, stats = self.get_host(host)
+        if not breaker.allow():
+            raise errors.HTTPUnavailable(host)
+
+        # Anything other than these could have done something on the first attempt
+        retries = self.retries if method in ("GET", "HEAD") else 0
+        attempt = 0
+        while True:
+            resp = None
+            start = time.perf_counter()
+            try:
+                async with semaphore:
+                    async with self.session.request(method, url, timeout=timeout, **kwargs) as resp:
+                        body = await resp.read()
+            except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError):
+                resp = None
+                if self.get_backoff(attempt, retries, None) is None:
+                    stats.failures += 1
+                    breaker.record_failure()
+                    raise
+            finally:
+                elapsed = time.perf_counter() - start
+                stats.record(elapsed)
+                if elapsed > SLOW_REQUEST:
+                    log.info(f"{method} {url} took {elapsed:.2f}s")
+
+            if resp is not None and resp.status not in RETRY_STATUSES:
+                breaker.record_success()
+                return HTTPResponse(resp, body)
+
+            delay = self.get_backoff(attempt, retries, resp)
+            if delay is None:
+                stats.failures += 1
+                # Ratelimits mean the host is up, so they don't count towards the breaker
+                if resp.status == 429:
+                    breaker.record_success()
+                else:
+                    breaker.record_failure()
+                return HTTPResponse(resp, body)
+
+            stats.retries += 1
+            attempt += 1
+            log.debug(f"Retrying {method} {url} in {delay:.2f}s (attempt {attempt})")
+            await asyncio.sleep(delay)
+
+    async def request(self, url, *, method: str = "GET", return_text=False,
+                      **kwargs) -> Union[dict, str, bytes]:
+        """Works like :func:`helpers.request`"""
+        resp = await self.send(method, url, **kwargs)
+        raise_for_status(resp, url)
+
+        if return_text is True:
+            return resp.text()
+
+        if resp.content_type == 'application/json':
+            return resp.json()
+        return resp.body
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
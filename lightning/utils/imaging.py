@@ -0,0 +1,141 @@
+"""
+Lightning.py - A personal Discord bot
+Copyright (C) 2019-2021 LightSage
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation at version 3 of the License.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+# Everything in here runs inside of worker processes, so functions need to stay at module level to be picklable.
+import io
+import textwrap
+
+from PIL import Image, ImageDraw, ImageFont
+
+TEMPLATES = ("resources/templates/kurisudraw.png", "resources/templates/fyi.png",
+             "resources/templates/inthehead.png", "resources/templates/fujiwara-iq.png")
+FONTS = (("resources/fonts/Montserrat-Regular.ttf", 42), ("resources/fonts/Heebo-Regular.ttf", 86))
+# Decoded templates are kept up to this many bytes per worker process
+ASSET_BUDGET = 64 * 1024 * 1024
+
+_templates = {}
+_fonts = {}
+_asset_bytes = 0
+
+
+def _image_size(img: Image.Image) -> int:
+    return img.width * img.height * len(img.getbands())
+
+
+def get_template(path: str) -> Image.Image:
+    """Gets a copy of a decoded template image, decoding and caching it if needed"""
+    global _asset_bytes
+
+    img = _templates.get(path)
+    if img is None:
+        img = Image.open(path)
+        img.load()
+        size = _image_size(img)
+        if _asset_bytes + size <= ASSET_BUDGET:
+            _templates[path] = img
+            _asset_bytes += size
+    # Renders draw on the image so every render gets its own copy
+    return img.copy()
+
+
+def get_font(path: str, size: int) -> ImageFont.FreeTypeFont:
+    """Gets a loaded font. Fonts aren't modified when drawing so the same object is shared."""
+    font = _fonts.get((path, size))
+    if font is None:
+        font = _fonts[(path, size)] = ImageFont.truetype(font=path, size=size, encoding="unic")
+    return font
+
+
+def preload_assets(templates: tuple = TEMPLATES, fonts: tuple = FONTS) -> None:
+    """Decodes the templates and fonts ahead of time. This is used as a worker process initializer."""
+    for path in templates:
+        get_template(path)
+
+    for path, size in fonts:
+        get_font(path, size)
+
+
+def _draw_centered_text(img: Image.Image, text: str, font: ImageFont.FreeTypeFont, *, width: int, y_text: int,
+                        max_y: int, wdmax: int) -> None:
+    draw = ImageDraw.Draw(img)
+    # Shoutouts to that person on stackoverflow that I don't remember
+    for line in textwrap.wrap(text, width=width):
+        if y_text >= max_y:
+            break
+        line_width, line_height = draw.textsize(line, font=font)
+        draw.multiline_text(((wdmax - line_width) / 2, y_text), line, font=font, fill="black")
+        y_text += line_height
+
+
+def _save(img: Image.Image, fmt: str = "png", **kwargs) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, fmt, **kwargs)
+    return buffer.getvalue()
+
+
+def render_kurisu_whiteboard(text: str) -> bytes:
+    img = get_template("resources/templates/kurisudraw.png")
+    font = get_font("resources/fonts/Montserrat-Regular.ttf", 42)
+    _draw_centered_text(img, text, font, width=20, y_text=228, max_y=390, wdmax=560)
+    return _save(img)
+
+
+def render_lakitu(text: str) -> bytes:
+    img = get_template("resources/templates/fyi.png")
+    font = get_font("resources/fonts/Heebo-Regular.ttf", 86)
+    _draw_centered_text(img, text, font, width=19, y_text=200, max_y=706, wdmax=1150)
+    return _save(img)
+
+
+def render_jpegify(data: bytes, quality: int, max_size: tuple = (2048, 2048)) -> bytes:
+    img = Image.open(io.BytesIO(data))
+    # JPEGs can be decoded at a reduced scale, which is a lot cheaper than decoding everything and resizing after.
+    img.draft("RGB", max_size)
+    img.thumbnail(max_size)
+    return _save(img.convert("RGB"), "jpeg", quality=quality)
+
+
+def render_circle_meme(avatar_bytes: bytes, path: str, resize_amount: tuple, paste: tuple) -> bytes:
+    base_image = get_template(path)
+    avatar = Image.open(io.BytesIO(avatar_bytes)).resize(resize_amount).convert("RGB")
+
+    mask = Image.new("L", avatar.size, 0)
+    mask_draw = ImageDraw.Draw(mask)
+    mask_draw.ellipse([(0, 0), avatar.size], fill=255)
+    mask = mask.resize(resize_amount, Image.ANTIALIAS)
+
+    base_image.paste(avatar, paste, mask=mask)
+    return _save(base_image)
+
+
+def convert_image(data: bytes, fmt: str = "png", *, max_pixels: int, optimize: bool = False) -> bytes:
+    """Converts an image to PNG or WebP.
+
+    Raises
+    ------
+    ValueError
+        Raised when the image has more pixels than allowed
+    OSError
+        Raised when the image can't be identified or is truncated
+    """
+    img = Image.open(io.BytesIO(data))
+    # The header is enough to know the size, so nothing is decoded yet
+    if img.width * img.height > max_pixels:
+        raise ValueError(f"Image is too large ({img.width}x{img.height})")
+
+    if fmt == "webp":
+        return _save(img, "webp", lossless=True, method=4 if optimize else 0)
+    return _save(img, "png", optimize=optimize)
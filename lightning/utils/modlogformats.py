@@ -20,7 +20,7 @@ from typing import Union
 
 import discord
 
-from lightning.formatters import truncate_text
+from lightning.formatters import plural, truncate_text
 from lightning.utils.helpers import Emoji
 from lightning.utils.time import get_utc_timestamp, natural_timedelta
 
@@ -86,6 +86,34 @@ log_actions = {
 }
 
 
+def format_infraction_ids(infraction_ids: list) -> str:
+    if not infraction_ids:
+        return "N/A"
+
+    first, last = min(infraction_ids), max(infraction_ids)
+    if len(infraction_ids) == 1:
+        return str(first)
+
+    if last - first + 1 == len(infraction_ids):
+        return f"{first}-{last}"
+
+    return f"{len(infraction_ids)} IDs between {first} and {last}"
+
+
+def join_user_ids(targets: list, limit: int) -> str:
+    """Joins the IDs of targets, stopping before the text would go over the limit"""
+    ids = []
+    length = 0
+    for index, target in enumerate(targets):
+        text = str(target.id)
+        if length + len(text) + 2 > limit - 20:
+            ids.append(f"and {len(targets) - index} more")
+            break
+        length += len(text) + 2
+        ids.append(text)
+    return ", ".join(ids)
+
+
 def construct_dm_message(member, action, location, *, middle=None, reason=None, ending=None):
     msg = f"You were {action} {location} {member.guild.name}"
     if middle:
@@ -134,6 +162,17 @@ class EmojiFormat(BaseFormat):
         message += f"\n\N{PENCIL}\N{VARIATION SELECTOR-16} __Reason__: \"{self.reason}\""
         return message
 
+    @staticmethod
+    def bulk_action(action, targets, moderator, infraction_ids, reason=None) -> str:
+        attrs = log_actions[str(action).lower()]
+        reason = truncate_text(reason or "no reason given", 512)
+        message = f"{attrs.emoji} **Mass {attrs.title}**: {moderator.mention} {attrs.tense} "\
+                  f"{plural(len(targets)):user}"\
+                  f"\n\N{LABEL} __Infraction IDs__: {format_infraction_ids(infraction_ids)}"\
+                  f"\n\N{PENCIL}\N{VARIATION SELECTOR-16} __Reason__: \"{reason}\""
+        ids = join_user_ids(targets, 1900 - len(message))
+        return f"{message}\n\N{BUSTS IN SILHOUETTE} __User IDs__: {ids}"
+
     @staticmethod
     def bot_addition(bot: discord.Member, mod) -> str:
         return f"\N{ROBOT FACE} **Bot Add** {mod.mention} added bot {bot.mention} | "\
@@ -319,6 +358,20 @@ class MinimalisticFormat(BaseFormat):
                   f" **Member Leave**: {discord.utils.escape_markdown(str(member))} ({member.id})"
         return msg
 
+    @staticmethod
+    def bulk_action(action, targets, moderator, infraction_ids, reason=None, *, with_timestamp=True) -> str:
+        log_action = log_actions[str(action).lower()]
+        if with_timestamp:
+            base = f"`[{datetime.utcnow().strftime('%H:%M:%S UTC')}]` "
+        else:
+            base = ""
+
+        base += f"**Mass {log_action.title}** | {plural(len(targets)):user} | "\
+                f"Infraction IDs {format_infraction_ids(infraction_ids)}"\
+                f"\n**Moderator**: {MinimalisticFormat.format_user(moderator)}"\
+                f"\n**Reason**: {escape_markdown_and_mentions(truncate_text(reason or 'no reason given', 512))}"
+        return f"{base}\n**Users**: {join_user_ids(targets, 1900 - len(base))}"
+
     def format_message(self, *, with_timestamp: bool = True) -> str:
         """Formats a log entry."""
         entry_time = self.timestamp
@@ -372,6 +425,19 @@ class EmbedFormat(BaseFormat):
         embed.timestamp = self.timestamp
         return embed
 
+    @staticmethod
+    def bulk_action(action, targets, moderator, infraction_ids, reason=None) -> discord.Embed:
+        log_action = log_actions[str(action).lower()]
+        embed = discord.Embed(title=f"Mass {log_action.title}", color=log_action.color)
+        reason = truncate_text(reason or "no reason given", 512)
+        embed.description = f"**Users**: {len(targets)}\n"\
+                            f"**Moderator**: {str(moderator)} <@!{moderator.id}>\n"\
+                            f"**Reason**: {discord.utils.escape_markdown(reason)}"
+        embed.add_field(name="User IDs", value=join_user_ids(targets, 1024))
+        embed.set_footer(text=truncate_text(f"Infraction IDs: {format_infraction_ids(infraction_ids)}", 2048))
+        embed.timestamp = datetime.utcnow()
+        return embed
+
     @staticmethod
     def timed_action_expired(action, moderator, user, created_at) -> discord.Embed:
         embed = discord.Embed(description=f"Time {action} for {base_user_format(user)} expired")
@@ -0,0 +1,152 @@
+"""
+Lightning.py - A personal Discord bot
+Copyright (C) 2019-2021 LightSage
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation at version 3 of the License.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, List, Optional, Set
+
+import discord
+
+from lightning.utils.fanout import FanOut
+
+log = logging.getLogger(__name__)
+
+MAX_CONTENT_LENGTH = 2000
+
+
+def _mentions_key(allowed_mentions: Optional[discord.AllowedMentions]) -> Optional[dict]:
+    return allowed_mentions.to_dict() if allowed_mentions is not None else None
+
+
+class QueuedMessage:
+    __slots__ = ('content', 'embed', 'allowed_mentions')
+
+    def __init__(self, content: Optional[str] = None, embed: Optional[discord.Embed] = None,
+                 allowed_mentions: Optional[discord.AllowedMentions] = None):
+        self.content = content
+        self.embed = embed
+        self.allowed_mentions = allowed_mentions
+
+    def can_merge(self, other) -> bool:
+        # Messageable.send only takes one embed, so only text is joined
+        if self.embed or other.embed or not self.content or not other.content:
+            return False
+
+        # Merging would let one message's mentions ping in the other, so they have to allow the same mentions
+        if _mentions_key(self.allowed_mentions) != _mentions_key(other.allowed_mentions):
+            return False
+
+        return len(self.content) + len(other.content) + 1 <= MAX_CONTENT_LENGTH
+
+    def merge(self, other) -> None:
+        self.content = f"{self.content}\n{other.content}"
+
+
+class ModLogQueue:
+    """A per-channel outbound queue for log messages.
+
+    Messages put into the queue are sent after a short delay. Consecutive text messages that allow the same
+    mentions are joined into one message (up to 2000 characters).
+
+    Parameters
+    ----------
+    bot : LightningBot
+        The bot instance
+    flush_interval : float, optional
+        How long to wait, in seconds, before a channel's queued messages are sent, by default 1.5
+    """
+
+    def __init__(self, bot, *, flush_interval: float = 1.5):
+        self.bot = bot
+        self.flush_interval = flush_interval
+        self._queues: Dict[int, deque] = {}
+        self._channels: Dict[int, discord.abc.Messageable] = {}
+        self._tasks: Dict[int, asyncio.Task] = {}
+        # Channels whose flush task is done sleeping and is sending messages
+        self._flushing: Set[int] = set()
+        self._closed = False
+        # One worker so messages are sent in order
+        self._fanout = FanOut(workers=1, dead_exceptions=(discord.NotFound,))
+
+    def put(self, channel: discord.TextChannel, content: Optional[str] = None, *, embed: Optional[discord.Embed] = None,
+            allowed_mentions: Optional[discord.AllowedMentions] = None) -> None:
+        """Queues a message to be sent to a channel. This returns immediately."""
+        message = QueuedMessage(content, embed, allowed_mentions)
+        self._queues.setdefault(channel.id, deque()).append(message)
+        self._channels[channel.id] = channel
+
+        if channel.id not in self._tasks:
+            self._tasks[channel.id] = self.bot.loop.create_task(self._flush_later(channel.id))
+
+    def coalesce(self, channel_id: int) -> List[QueuedMessage]:
+        queue = self._queues.pop(channel_id, deque())
+        messages = []
+        while queue:
+            message = queue.popleft()
+            if messages and messages[-1].can_merge(message):
+                messages[-1].merge(message)
+            else:
+                messages.append(message)
+        return messages
+
+    async def send(self, channel: discord.TextChannel, message: QueuedMessage) -> None:
+        await channel.send(message.content, embed=message.embed, allowed_mentions=message.allowed_mentions)
+
+    async def _flush_later(self, channel_id: int) -> None:
+        try:
+            await asyncio.sleep(self.flush_interval)
+            self._flushing.add(channel_id)
+            await self.flush(channel_id)
+        finally:
+            self._flushing.discard(channel_id)
+            self._tasks.pop(channel_id, None)
+
+        # Anything queued while we were sending gets its own flush.
+        if self._queues.get(channel_id) and channel_id not in self._tasks and not self._closed:
+            self._tasks[channel_id] = self.bot.loop.create_task(self._flush_later(channel_id))
+
+    async def flush(self, channel_id: int) -> None:
+        """Sends everything that's queued for a channel"""
+        channel = self._channels.pop(channel_id, None)
+        messages = self.coalesce(channel_id)
+        if channel is None or not messages:
+            return
+
+        async def send(message):
+            await self.send(channel, message)
+
+        result = await self._fanout.run(messages, send)
+        if result.dead or result.failed:
+            log.debug(f"Failed to send {len(result.dead) + len(result.failed)} log message(s) to {channel_id}")
+
+    async def close(self) -> None:
+        """Cancels the pending timers, waits for flushes that are already sending, then sends what's left"""
+        self._closed = True
+        in_flight = []
+        for channel_id, task in list(self._tasks.items()):
+            if channel_id in self._flushing:
+                # These have already taken their messages from the queue, so cancelling them would lose them
+                in_flight.append(task)
+            else:
+                task.cancel()
+        self._tasks.clear()
+
+        if in_flight:
+            await asyncio.gather(*in_flight, return_exceptions=True)
+
+        for channel_id in list(self._queues):
+            await self.flush(channel_id)
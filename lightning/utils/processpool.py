@@ -0,0 +1,136 @@
+"""
+Lightning.py - A personal Discord bot
+Copyright (C) 2019-2021 LightSage
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation at version 3 of the License.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict
+
+from lightning.errors import LightningError
+
+log = logging.getLogger(__name__)
+
+
+class WorkerPool:
+    """A dedicated process pool for CPU heavy jobs like image rendering.
+
+    Jobs are rejected right away when too many are pending instead of piling up behind each other.
+
+    Parameters
+    ----------
+    workers : int, optional
+        The amount of worker processes, by default 2
+    max_pending : int, optional
+        The maximum amount of jobs that can be running or waiting at once, by default 8
+    timeout : float, optional
+        How long to wait for a job before giving up, by default 30.0
+    initializer : Callable, optional
+        A function that is run in every worker process when it starts
+    initargs : tuple, optional
+        Arguments passed to the initializer
+    """
+
+    def __init__(self, *, workers: int = 2, max_pending: int = 8, timeout: float = 30.0,
+                 initializer: Callable = None, initargs: tuple = ()):
+        self.workers = workers
+        self.initializer = initializer
+        self.initargs = initargs
+        self.executor = self._create_executor()
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.pending = 0
+        # job name -> [amount of successful jobs, total seconds]
+        self.stats: Dict[str, list] = {}
+        self.timeouts = 0
+        self.failures = 0
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=self.initializer, initargs=self.initargs)
+
+    def _restart(self, executor: ProcessPoolExecutor) -> None:
+        # Several jobs can fail from the same broken pool, only the first one needs to replace it
+        if self.executor is not executor:
+            return
+
+        log.warning("A worker process died, restarting the pool")
+        executor.shutdown(wait=False)
+        self.executor = self._create_executor()
+
+    def _release(self, loop: asyncio.AbstractEventLoop, future: Future) -> None:
+        # This is called from the executor's management thread
+        loop.call_soon_threadsafe(self._decrement)
+
+    def _decrement(self) -> None:
+        self.pending -= 1
+
+    def _record(self, name: str, elapsed: float) -> None:
+        stats = self.stats.setdefault(name, [0, 0.0])
+        stats[0] += 1
+        stats[1] += elapsed
+
+    def average_time(self, name: str) -> float:
+        """Gets the average time in seconds a successful job took"""
+        count, total = self.stats.get(name, (0, 0.0))
+        return total / count if count else 0.0
+
+    async def run(self, func: Callable, *args, timeout: float = None, **kwargs) -> Any:
+        """Runs a function in the pool.
+
+        The function and its arguments must be picklable, so the function has to be defined at module level.
+
+        Raises
+        ------
+        LightningError
+            Raised when the pool is full or the job timed out
+        """
+        if self.pending >= self.max_pending:
+            raise LightningError("I'm processing too many things right now! Try again in a bit.")
+
+        loop = asyncio.get_event_loop()
+        executor = self.executor
+        start = time.perf_counter()
+        try:
+            future = executor.submit(functools.partial(func, *args, **kwargs))
+        except BrokenProcessPool:
+            self._restart(executor)
+            executor = self.executor
+            future = executor.submit(functools.partial(func, *args, **kwargs))
+
+        # The slot is only given back once the job is actually done, even if we stop waiting for it.
+        self.pending += 1
+        future.add_done_callback(functools.partial(self._release, loop))
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise LightningError("That took too long to process!")
+        except BrokenProcessPool:
+            self.failures += 1
+            self._restart(executor)
+            raise LightningError("Something went wrong while processing that. Try again later.")
+        except Exception:
+            self.failures += 1
+            raise
+
+        # Failed jobs are counted separately so they don't skew the timings
+        self._record(func.__name__, time.perf_counter() - start)
+        return result
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False)
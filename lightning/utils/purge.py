@@ -0,0 +1,118 @@
+"""
+Lightning.py - A personal Discord bot
+Copyright (C) 2019-2021 LightSage
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation at version 3 of the License.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, Optional
+
+import discord
+
+from lightning.formatters import plural
+
+log = logging.getLogger(__name__)
+
+BULK_DELETE_LIMIT = 100
+# Discord rejects bulk deletes of messages older than 14 days. The extra minute covers
+# messages that age past the limit while a batch is being built.
+BULK_DELETE_MAX_AGE = timedelta(days=14) - timedelta(minutes=1)
+
+
+class PurgeJob:
+    """Deletes messages from a channel while reading its history page by page.
+
+    Only the amount of deleted messages per author is kept, so memory use doesn't grow with the amount of messages.
+
+    Parameters
+    ----------
+    channel : discord.TextChannel
+        The channel to delete messages from
+    predicate : Callable[[discord.Message], bool]
+        A function that returns whether a message should be deleted
+    limit : int
+        The amount of messages to search
+    before : Optional[discord.abc.Snowflake]
+        Only search messages before this
+    after : Optional[discord.abc.Snowflake]
+        Only search messages after this
+    progress : Optional[Callable[[PurgeJob], Awaitable]]
+        A coroutine function called after every deleted batch
+    """
+
+    def __init__(self, channel: discord.TextChannel, predicate: Callable[[discord.Message], bool], *, limit: int,
+                 before=None, after=None, progress: Optional[Callable[['PurgeJob'], Awaitable]] = None):
+        self.channel = channel
+        self.predicate = predicate
+        self.limit = limit
+        self.before = before
+        self.after = after
+        self.progress = progress
+
+        self.authors = Counter()
+        self.scanned = 0
+        self.deleted = 0
+
+    def filter_page(self, page: List[discord.Message]) -> List[discord.Message]:
+        return [message for message in page if self.predicate(message)]
+
+    async def delete_batch(self, messages: List[discord.Message]) -> None:
+        if not messages:
+            return
+
+        cutoff = discord.utils.time_snowflake(datetime.utcnow() - BULK_DELETE_MAX_AGE)
+        bulk = [message for message in messages if message.id >= cutoff]
+        old = [message for message in messages if message.id < cutoff]
+
+        for index in range(0, len(bulk), BULK_DELETE_LIMIT):
+            chunk = bulk[index:index + BULK_DELETE_LIMIT]
+            await self.channel.delete_messages(chunk)
+            self.count(chunk)
+
+        for message in old:
+            try:
+                await message.delete()
+            except discord.NotFound:
+                continue
+            self.count([message])
+
+        if self.progress is not None:
+            await self.progress(self)
+
+    def count(self, messages: List[discord.Message]) -> None:
+        self.deleted += len(messages)
+        self.authors.update(str(message.author) for message in messages)
+
+    async def run(self) -> None:
+        """Runs the purge. This can be cancelled at any point and keeps what was deleted so far."""
+        page = []
+        async for message in self.channel.history(limit=self.limit, before=self.before, after=self.after):
+            self.scanned += 1
+            page.append(message)
+            # History is fetched 100 messages at a time, so filter and delete in the same sized batches
+            if len(page) == BULK_DELETE_LIMIT:
+                await self.delete_batch(self.filter_page(page))
+                page = []
+
+        await self.delete_batch(self.filter_page(page))
+
+    def format_results(self) -> str:
+        messages = [f"**{plural(self.deleted):message} purged**"]
+        if self.deleted:
+            messages.append('')
+            messages.extend(f'{name}: {count}' for name, count in self.authors.most_common(20))
+            if len(self.authors) > 20:
+                messages.append(f"...and {len(self.authors) - 20} more")
+        return '\n'.join(messages)
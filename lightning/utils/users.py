@@ -0,0 +1,120 @@
+"""
+Lightning.py - A personal Discord bot
+Copyright (C) 2019-2021 LightSage
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation at version 3 of the License.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import asyncio
+import logging
+from typing import Dict, Iterable, Optional
+
+import discord
+from lru import LRU
+
+log = logging.getLogger(__name__)
+
+# Marks IDs that don't belong to a user so they aren't fetched over and over
+_MISSING = object()
+
+
+class UserResolver:
+    """Resolves user IDs to users in bulk.
+
+    Users are looked up in the bot's cache first, then in an LRU of previously fetched users.
+    Anything left is fetched concurrently with a limit on how many requests run at once.
+
+    Parameters
+    ----------
+    bot : LightningBot
+        The bot instance
+    max_size : int, optional
+        The maximum amount of fetched users to keep, by default 1024
+    concurrency : int, optional
+        The maximum amount of fetches that can run at once, by default 5
+    """
+
+    def __init__(self, bot, *, max_size: int = 1024, concurrency: int = 5):
+        self.bot = bot
+        self._fetched = LRU(max_size)
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    def get(self, user_id: int) -> Optional[discord.User]:
+        """Gets a user from the cache without fetching"""
+        user = self.bot.get_user(user_id)
+        if user is not None:
+            return user
+
+        user = self._fetched.get(user_id)
+        return None if user is _MISSING else user
+
+    async def _fetch(self, user_id: int) -> Optional[discord.User]:
+        async with self._semaphore:
+            try:
+                user = await self.bot.fetch_user(user_id)
+            except discord.NotFound:
+                self._fetched[user_id] = _MISSING
+                return None
+            except discord.HTTPException as e:
+                log.debug(f"Failed to fetch user {user_id}: {e}")
+                return None
+
+        self._fetched[user_id] = user
+        return user
+
+    async def resolve(self, user_id: int) -> Optional[discord.User]:
+        """Resolves a single user ID"""
+        users = await self.resolve_many([user_id])
+        return users.get(user_id)
+
+    async def resolve_many(self, user_ids: Iterable[int]) -> Dict[int, Optional[discord.User]]:
+        """Resolves many user IDs at once.
+
+        Parameters
+        ----------
+        user_ids : Iterable[int]
+            The user IDs to resolve
+
+        Returns
+        -------
+        Dict[int, Optional[discord.User]]
+            A mapping of the user IDs to the users. IDs that couldn't be resolved map to None.
+        """
+        resolved = {}
+        waiting = {}
+        for user_id in set(user_ids):
+            if user_id is None:
+                continue
+
+            user = self.bot.get_user(user_id)
+            if user is None:
+                user = self._fetched.get(user_id)
+            if user is not None:
+                resolved[user_id] = None if user is _MISSING else user
+                continue
+
+            future = self._pending.get(user_id)
+            if future is None:
+                future = self._pending[user_id] = asyncio.ensure_future(self._fetch(user_id))
+                future.add_done_callback(lambda _, user_id=user_id: self._pending.pop(user_id, None))
+            waiting[user_id] = future
+
+        if waiting:
+            # Other callers could be waiting on the same fetch so don't let cancellation propagate to it.
+            results = await asyncio.gather(*(asyncio.shield(future) for future in waiting.values()))
+            resolved.update(zip(waiting.keys(), results))
+
+        return resolved
+
+    def clear(self) -> None:
+        self._fetched.clear()
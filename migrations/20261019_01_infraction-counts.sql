@@ -0,0 +1,17 @@
+-- Adds a counter table for infractions per (guild, user, action)
+-- depends:
+
+CREATE TABLE IF NOT EXISTS infraction_counts
+(
+    guild_id BIGINT,
+    user_id BIGINT,
+    action INT,
+    count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (guild_id, user_id, action)
+);
+
+INSERT INTO infraction_counts (guild_id, user_id, action, count)
+SELECT guild_id, user_id, action, COUNT(*) FROM infractions
+WHERE guild_id IS NOT NULL AND user_id IS NOT NULL AND action IS NOT NULL
+GROUP BY guild_id, user_id, action
+ON CONFLICT (guild_id, user_id, action) DO UPDATE SET count = EXCLUDED.count;
@@ -0,0 +1,3 @@
+DROP INDEX IF EXISTS infractions_guild_id_id_idx;
+DROP INDEX IF EXISTS infractions_guild_id_user_id_id_idx;
+DROP INDEX IF EXISTS infractions_guild_id_moderator_id_id_idx;
@@ -0,0 +1,6 @@
+-- Adds indexes for paginating infractions by id
+-- depends: 20261019_01_infraction-counts
+
+CREATE INDEX IF NOT EXISTS infractions_guild_id_id_idx ON infractions (guild_id, id);
+CREATE INDEX IF NOT EXISTS infractions_guild_id_user_id_id_idx ON infractions (guild_id, user_id, id);
+CREATE INDEX IF NOT EXISTS infractions_guild_id_moderator_id_id_idx ON infractions (guild_id, moderator_id, id);
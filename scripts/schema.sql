@@ -107,3 +107,17 @@ CREATE TABLE IF NOT EXISTS infractions
     active BOOLEAN DEFAULT 't',
     extra JSONB
 );
+
+CREATE INDEX IF NOT EXISTS infractions_guild_id_id_idx ON infractions (guild_id, id);
+CREATE INDEX IF NOT EXISTS infractions_guild_id_user_id_id_idx ON infractions (guild_id, user_id, id);
+CREATE INDEX IF NOT EXISTS infractions_guild_id_moderator_id_id_idx ON infractions (guild_id, moderator_id, id);
+
+-- Maintained alongside infractions so counts don't need a scan
+CREATE TABLE IF NOT EXISTS infraction_counts
+(
+    guild_id BIGINT,
+    user_id BIGINT,
+    action INT,
+    count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (guild_id, user_id, action)
+);
@@ -0,0 +1,88 @@
+"""
+Lightning.py - A personal Discord bot
+Copyright (C) 2019-2021 LightSage
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation at version 3 of the License.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import asyncio
+import json
+import time
+
+import pytest
+
+reminders = pytest.importorskip("lightning.cogs.reminders")
+from lightning.config import Storage  # noqa: E402
+
+FEED_URL = "https://yls8.mtheall.com/ninupdates/feed.php"
+ITEM = """<item>
+<title>{console} {version}</title>
+<link>https://yls8.mtheall.com/ninupdates/reports.php?sys={console}&amp;reportdate={version}</link>
+<pubDate>{date}</pubDate>
+</item>"""
+
+
+def make_feed(items) -> bytes:
+    body = "".join(ITEM.format(console=console, version=version, date=date) for console, version, date in items)
+    return f"""<?xml version="1.0"?><rss version="2.0"><channel><title>ninupdates</title>
+{body}</channel></rss>""".encode()
+
+
+@pytest.fixture
+def storage(tmp_path):
+    path = tmp_path / "nindy_data.json"
+    path.write_text(json.dumps({"3DS": {"version": "11.14.0-46", "last_updated": "2020-12-01T00:00:00+00:00"},
+                                "Switch": {"version": "11.0.0"}}))
+    loop = asyncio.new_event_loop()
+    yield Storage(str(path), loop=loop)
+    loop.close()
+
+
+def test_last_updated_times_skips_consoles_without_a_timestamp(storage):
+    assert reminders.get_last_updated_times(storage) == {"3DS": "2020-12-01T00:00:00+00:00"}
+
+
+def test_changed_feed_only_returns_new_entries(storage):
+    feed = make_feed([("3DS", "11.15.0-47", "Mon, 10 May 2021 12:00:00 +0000"),
+                      ("3DS", "11.13.0-45", "Sun, 01 Nov 2020 12:00:00 +0000"),
+                      ("Switch", "12.0.0", "Tue, 06 Apr 2021 12:00:00 +0000")])
+    entries = reminders.parse_ninupdates_feed(feed, FEED_URL, reminders.get_last_updated_times(storage))
+
+    assert [(console, version) for console, version, _, _ in entries] == [("3DS", "11.15.0-47"),
+                                                                          ("Switch", "12.0.0")]
+
+
+def test_parsing_a_large_feed_does_not_block_the_event_loop(storage):
+    # Every console is new so every entry is returned
+    feed = make_feed([(f"Console{i}", "1.0.0", "Mon, 10 May 2021 12:00:00 +0000") for i in range(5000)])
+
+    async def measure_lag():
+        lag = 0.0
+
+        async def ticker():
+            nonlocal lag
+            while True:
+                start = time.perf_counter()
+                await asyncio.sleep(0.01)
+                lag = max(lag, time.perf_counter() - start - 0.01)
+
+        task = asyncio.ensure_future(ticker())
+        loop = asyncio.get_event_loop()
+        entries = await loop.run_in_executor(None, reminders.parse_ninupdates_feed, feed, FEED_URL,
+                                             reminders.get_last_updated_times(storage))
+        task.cancel()
+        return entries, lag
+
+    entries, lag = asyncio.run(measure_lag())
+    assert len(entries) == 5000
+    # Parsing runs in an executor, so the loop should keep ticking while it runs
+    assert lag < 0.25